@@ -1,26 +1,33 @@
+import asyncio
 import re
 import requests
-import unittest
-from bs4 import BeautifulSoup
+import soupsieve
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.builder import builder_registry
 from datetime import datetime, timedelta, timezone
 import json
+import heapq
+import itertools
 import math
 import random
 import time
 import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+from http.cookies import SimpleCookie
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Blackbox
 import base64
 from random import randint
-from urllib.parse import quote
+from urllib.parse import parse_qsl, quote, urlsplit
 
-# Captcha
+# Captcha, the image stack itself is imported by solve_captcha
 import io
-from PIL import Image
-import imagehash
-import cv2
 import shutil
-from pytesseract import image_to_string
 
 try:
     import constants as const
@@ -30,6 +37,298 @@ except ImportError:
 user_agent_raw = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/111.0.0.0 Safari/537.36'
 
 
+class DeadlineExceeded(requests.exceptions.Timeout):
+    pass
+
+
+class RequestScheduler(object):
+    priorities = {'fleet': 0, 'events': 1, 'building': 2, 'scan': 3}
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.condition = threading.Condition()
+        self.waiting = []
+        self.sequence = itertools.count()
+        self.granted = dict.fromkeys(RequestScheduler.priorities, 0)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(
+            self.burst, self.tokens + (now - self.updated) * self.rate
+        )
+        self.updated = now
+
+    def acquire(self, priority='building', deadline=None):
+        ticket = (RequestScheduler.priorities[priority], next(self.sequence))
+        with self.condition:
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    self._refill()
+                    if self.waiting[0] == ticket and self.tokens >= 1:
+                        self.tokens -= 1
+                        self.granted[priority] += 1
+                        return
+                    wait = None
+                    if self.tokens < 1:
+                        wait = (1 - self.tokens) / self.rate
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise DeadlineExceeded(
+                                f'Deadline exceeded waiting for request budget ({priority})'
+                            )
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self.condition.wait(wait)
+            finally:
+                # granted or given up, the next ticket in line may go
+                self.waiting.remove(ticket)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+
+    def stats(self):
+        with self.condition:
+            self._refill()
+            return {
+                'rate': self.rate,
+                'tokens': self.tokens,
+                'waiting': len(self.waiting),
+                'granted': dict(self.granted)
+            }
+
+
+class SessionExpired(requests.exceptions.RequestException):
+    pass
+
+
+class RetryPolicy(object):
+    statuses = (500, 502, 503, 504)
+
+    def __init__(self, retries=3, backoff=0.5, cap=8, statuses=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.cap = cap
+        if statuses is not None:
+            self.statuses = tuple(statuses)
+        self.lock = threading.Lock()
+        self.retried = 0
+        self.recovered = 0
+        self.gave_up = 0
+        self.reasons = {}
+
+    def delay(self, attempt):
+        # full jitter keeps threads that failed together from retrying together
+        return random.uniform(0, min(self.cap, self.backoff * 2 ** attempt))
+
+    def wait(self, attempt, reason, remaining=None):
+        delay = self.delay(attempt)
+        with self.lock:
+            if attempt >= self.retries \
+                    or (remaining is not None and delay >= remaining):
+                if attempt:
+                    self.gave_up += 1
+                return False
+            self.retried += 1
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        time.sleep(delay)
+        return True
+
+    def succeeded(self, attempt):
+        if attempt:
+            with self.lock:
+                self.recovered += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                'retried': self.retried,
+                'recovered': self.recovered,
+                'gave_up': self.gave_up,
+                'reasons': dict(self.reasons)
+            }
+
+
+# Requests that only read, galaxyContent is a read sent as POST and the
+# message list takes action=107
+read_requests = (
+    ('component', 'galaxyContent'),
+    ('action', 'fetchEventBox'),
+    ('page', 'fetchResources'),
+    ('page', 'messages'),
+)
+# GETs carrying one of these are actions (deconstruct, cancel, return fleet,
+# repairs) and are never sent twice
+state_parameters = ('action', 'modus', 'token', 'return')
+
+
+def is_idempotent(method, url, params=None):
+    query = {}
+    for name, value in parse_qsl(urlsplit(url).query):
+        query.setdefault(name, []).append(value)
+    for name, value in dict(params or {}).items():
+        query.setdefault(name, []).append(str(value))
+    if 'galaxyContent' in query.get('component', ()):
+        return True
+    if method.upper() not in ('GET', 'HEAD'):
+        return False
+    if any(value in query.get(name, ()) for name, value in read_requests):
+        return True
+    return not any(name in query for name in state_parameters)
+
+
+def is_logged_out(url, response):
+    if '/game/index.php' not in url:
+        return False
+    if 'lobby' in urlsplit(response.url).netloc:
+        return True
+    full_page = 'page=ingame' in url \
+        and 'ajax=1' not in url and 'asJson' not in url
+    return full_page and response.ok \
+        and 'ogame-player-id' not in response.text
+
+
+class GameSession(requests.Session):
+    def __init__(
+            self, timeout=None,
+            pool_connections=10, pool_maxsize=16, max_retries=0, keep_alive=True,
+            scheduler=None, retry=None
+    ):
+        super().__init__()
+        self.timeout = timeout
+        self.scheduler = scheduler
+        self.retry = retry
+        self.reauthenticate = None
+        self.generation = 0
+        self.renew_lock = threading.Lock()
+        self.local = threading.local()
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+            max_retries=max_retries
+        )
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+
+    @contextmanager
+    def deadline(self, seconds):
+        previous = getattr(self.local, 'deadline', None)
+        if seconds is not None:
+            expires = time.monotonic() + seconds
+            if previous is not None:
+                expires = min(previous, expires)
+            self.local.deadline = expires
+        try:
+            yield
+        finally:
+            self.local.deadline = previous
+
+    @contextmanager
+    def priority(self, name):
+        ranks = RequestScheduler.priorities
+        if name not in ranks:
+            raise ValueError(f'unknown priority {name}, use one of {list(ranks)}')
+        previous = getattr(self.local, 'priority', None)
+        # nested calls keep the most urgent class
+        if previous is None or ranks[name] < ranks[previous]:
+            self.local.priority = name
+        try:
+            yield
+        finally:
+            self.local.priority = previous
+
+    @contextmanager
+    def authenticating(self):
+        previous = getattr(self.local, 'authenticating', False)
+        self.local.authenticating = True
+        try:
+            yield
+        finally:
+            self.local.authenticating = previous
+
+    def request(self, method, url, *args, **kwargs):
+        generation = self.generation
+        response = self._retrying(method, url, *args, **kwargs)
+        if self.reauthenticate is None \
+                or getattr(self.local, 'authenticating', False) \
+                or not is_logged_out(url, response):
+            return response
+        self._renew(generation)
+        if not is_idempotent(method, url, kwargs.get('params')):
+            # the token sent with it belonged to the old session
+            raise SessionExpired(f'Session expired before {method} {url}, it was renewed')
+        return self._retrying(method, url, *args, **kwargs)
+
+    def _renew(self, generation):
+        with self.renew_lock:
+            # threads that saw the same expiry share one re-authentication
+            if self.generation != generation:
+                return
+            with self.authenticating():
+                self.reauthenticate()
+            self.generation += 1
+
+    def _retrying(self, method, url, *args, **kwargs):
+        retry = self.retry
+        if retry is not None \
+                and not is_idempotent(method, url, kwargs.get('params')):
+            retry = None
+        attempt = 0
+        while True:
+            try:
+                response = self._send(method, url, *args, **kwargs)
+            except DeadlineExceeded:
+                raise
+            except (requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout) as e:
+                if retry is None \
+                        or not retry.wait(attempt, type(e).__name__, self._remaining()):
+                    raise
+            else:
+                if retry is None:
+                    return response
+                if response.status_code not in retry.statuses:
+                    retry.succeeded(attempt)
+                    return response
+                if not retry.wait(attempt, response.status_code, self._remaining()):
+                    return response
+                response.close()
+            attempt += 1
+
+    def _remaining(self):
+        deadline = getattr(self.local, 'deadline', None)
+        if deadline is None:
+            return None
+        return deadline - time.monotonic()
+
+    def _send(self, method, url, *args, **kwargs):
+        timeout = kwargs.pop('timeout', None) or self.timeout
+        deadline = getattr(self.local, 'deadline', None)
+        if self.scheduler is not None:
+            self.scheduler.acquire(
+                getattr(self.local, 'priority', None) or 'building', deadline
+            )
+        if deadline is None:
+            return super().request(method, url, *args, timeout=timeout, **kwargs)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded(f'Deadline exceeded before {method} {url}')
+        if isinstance(timeout, tuple):
+            timeout = tuple(min(part, remaining) for part in timeout)
+        else:
+            timeout = min(timeout or remaining, remaining)
+        try:
+            return super().request(method, url, *args, timeout=timeout, **kwargs)
+        except requests.exceptions.Timeout as e:
+            if time.monotonic() < deadline:
+                raise
+            raise DeadlineExceeded(f'Deadline exceeded during {method} {url}') from e
+
+
 class OGame(object):
     def __init__(
             self,
@@ -38,7 +337,12 @@ class OGame(object):
             password,
             is_pioneer=False,
             token=None, proxy='',
-            language=None, server_number=None, blackbox_token=None
+            language=None, server_number=None, blackbox_token=None,
+            parser=None, event_box_ttl=5, cache=False, timeout=(5, 30),
+            pool_connections=10, pool_maxsize=16, max_retries=0, keep_alive=True,
+            request_budget=None, retry=True, state_file=None,
+            servers_cache=None, servers_ttl=3600, production_ttl=600,
+            research_ttl=300
     ):
         self.universe = universe
         self.username = username
@@ -47,7 +351,29 @@ class OGame(object):
         self.language = language
         self.server_number = server_number
         self.is_pioneer = is_pioneer
-        self.session = requests.Session()
+        self.state_file = state_file
+        self.servers_cache = servers_cache
+        self.servers_ttl = servers_ttl
+        self.accounts = None
+        self.parser = parser_backend(parser)
+        self.event_box_ttl = event_box_ttl
+        self.event_box_snapshot = None
+        self.flight = SingleFlight(lambda: self.session._remaining())
+        if cache is True:
+            cache = ResponseCache()
+        self.cache = cache or None
+        self.production_ttl = production_ttl
+        self.production_figures = {}
+        self.research_ttl = research_ttl
+        self.research_state = None
+        if isinstance(request_budget, (int, float)):
+            request_budget = RequestScheduler(request_budget)
+        if retry is True:
+            retry = RetryPolicy()
+        self.session = GameSession(
+            timeout, pool_connections, pool_maxsize, max_retries, keep_alive,
+            request_budget, retry or None
+        )
         self.session.proxies.update({'https': self.proxy})
         self.token = token
         self.blackbox_token = blackbox_token
@@ -56,15 +382,87 @@ class OGame(object):
             'User-Agent': f'{self.user_agent_raw}'
         }
         self.session.headers.update(self.user_agent)
+        self.session.reauthenticate = self._reauthenticate
+        self._login()
 
+    def _login(self):
+        with self.session.authenticating():
+            if self.state_file is not None and self._warm_start():
+                return
+            self._lobby_login()
+
+    def _warm_start(self):
         try:
-            if token is None:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if state.get('universe') != self.universe \
+                or state.get('username') != self.username:
+            return False
+        for cookie in state['cookies']:
+            self.session.cookies.set(**cookie)
+        if self.token is None:
+            self.token = state['token']
+        self.server_number = state['server_number']
+        self.language = state['language']
+        self.server_id = state['server_id']
+        self.index_php = state['index_php']
+        # the landing page is needed anyway, it doubles as the validation
+        url = self.index_php + 'page=ingame'
+        response = self.session.get(url)
+        if is_logged_out(url, response):
+            print('State file expired')
+            return False
+        print('Login with state file')
+        self.landing = LandingState(BeautifulSoup4(response.text, self.parser))
+        self.player = self.landing.player
+        self.player_id = self.landing.player_id
+        print(f'Player ID: {self.player_id}')
+        return True
+
+    def save_state(self, path=None):
+        path = path or self.state_file
+        state = {
+            'universe': self.universe,
+            'username': self.username,
+            'token': self.token,
+            'server_number': self.server_number,
+            'language': self.language,
+            'server_id': self.server_id,
+            'index_php': self.index_php,
+            'cookies': [
+                {
+                    'name': cookie.name,
+                    'value': cookie.value,
+                    'domain': cookie.domain,
+                    'path': cookie.path,
+                    'secure': cookie.secure,
+                    'expires': cookie.expires
+                }
+                for cookie in self.session.cookies
+            ]
+        }
+        # the file holds the bearer token, mkstemp keeps it private
+        write_json(path, state)
+
+    def _store_state(self):
+        # a worker that could not write the state file is still logged in
+        try:
+            self.save_state()
+        except OSError as e:
+            print(e)
+
+    def _lobby_login(self):
+        self.accounts = None
+        try:
+            if self.token is None:
                 print("Login without Token")
                 self.login()
             else:
                 print("Login with Token")
                 self.session.headers.update(
-                    {'authorization': f'Bearer {token}'}
+                    {'authorization': f'Bearer {self.token}'}
                 )
                 self.set_cookies_and_accounts()
 
@@ -74,43 +472,68 @@ class OGame(object):
 
             self.index_php = f'https://s{self.server_number}-{self.language}.ogame.gameforge.com/game/index.php?'
 
-            self.blackbox_token = get_blackbox()
-
-            self.set_headers_and_cookies()
-
-            params = {
-                "id": self.server_id,
-                "server": {
-                    "language": self.language,
-                    "number": self.server_number
-                },
-                "clickedButton": "quick_join",
-                "blackbox": f"tra:{self.blackbox_token}"
-            }
-
-            login_url = self.get_login_link(params)
-
-            self.landing_page = self.session.get(login_url).text
+            self._enter_universe()
 
-            self.landing_page = self.session.get(
+            landing_page = self.session.get(
                 self.index_php + 'page=ingame'
             ).text
 
-            self.landing_page = BeautifulSoup4(self.landing_page)
+            self.landing = LandingState(
+                BeautifulSoup4(landing_page, self.parser)
+            )
 
-            self.player = self.landing_page.find(
-                'meta', {'name': 'ogame-player-name'}
-            )['content']
-            self.player_id = int(self.landing_page.find(
-                'meta', {'name': 'ogame-player-id'}
-            )['content'])
+            self.player = self.landing.player
+            self.player_id = self.landing.player_id
 
             print(f'Player ID: {self.player_id}')
 
             del self.session.headers['authorization']
+
+            if self.state_file is not None:
+                self._store_state()
         except Exception as e:
             print(e)
 
+    def _enter_universe(self):
+        self.blackbox_token = get_blackbox()
+
+        self.set_headers_and_cookies()
+
+        params = {
+            "id": self.server_id,
+            "server": {
+                "language": self.language,
+                "number": self.server_number
+            },
+            "clickedButton": "quick_join",
+            "blackbox": f"tra:{self.blackbox_token}"
+        }
+
+        login_url = self.get_login_link(params)
+
+        self.session.get(login_url)
+
+    def _reauthenticate(self):
+        # a fresh loginLink with the bearer token we already hold, the
+        # password login only runs when the lobby rejects that token
+        self.session.headers.update(
+            {'authorization': f'Bearer {self.token}'}
+        )
+        try:
+            self._enter_universe()
+        except (ValueError, KeyError):
+            del self.session.headers['authorization']
+            self.token = None
+            self.login()
+            self._enter_universe()
+        finally:
+            self.session.headers.pop('authorization', None)
+        if self.cache is not None:
+            self.cache.clear()
+        self.event_box_snapshot = None
+        if self.state_file is not None:
+            self._store_state()
+
     def login(self):
 
         try:
@@ -248,49 +671,56 @@ class OGame(object):
         self.session.cookies.update(cookies)
 
         # Get the accounts
-        if self.is_pioneer == 1:
-            accounts = self.session.get(
-                url='https://lobby-pioneers.ogame.gameforge.com/api/users/me/accounts'
-            ).json()
-        else:
-            accounts = self.session.get(
-                url='https://lobby.ogame.gameforge.com/api/users/me/accounts'
-            ).json()
-
-        # Set the language from the first account if not already set
-        if self.language is None:
-            self.language = accounts[0]['server']['language']
+        accounts = self._accounts()
 
         # If there's an error in the accounts, remove the authorization header and call the login function
         if 'error' in accounts:
             del self.session.headers['authorization']
+            self.accounts = None
             self.login()
+            accounts = self._accounts()
+
+        # Set the language from the first account if not already set
+        if self.language is None:
+            self.language = accounts[0]['server']['language']
+
+    def _accounts(self):
+        # fetched once per login, set_server_id reads the same list
+        if self.accounts is None:
+            if self.is_pioneer == 1:
+                self.accounts = self.session.get(
+                    url='https://lobby-pioneers.ogame.gameforge.com/api/users/me/accounts'
+                ).json()
+            else:
+                self.accounts = self.session.get(
+                    url='https://lobby.ogame.gameforge.com/api/users/me/accounts'
+                ).json()
+        return self.accounts
 
     def get_server_number_and_language(self):
         # Get the server list
         if self.is_pioneer == 1:
-            servers = self.session.get(
-                url='https://lobby-pioneers.ogame.gameforge.com/api/servers'
-            ).json()
+            url = 'https://lobby-pioneers.ogame.gameforge.com/api/servers'
         else:
-            servers = self.session.get(
-                url='https://lobby.ogame.gameforge.com/api/servers'
-            ).json()
+            url = 'https://lobby.ogame.gameforge.com/api/servers'
+        started = time.time()
+        servers = server_index(
+            self.session, url, self.servers_cache, self.servers_ttl
+        )
+        server = servers.find(self.universe, self.language)
+        if server is None and servers.fetched < started:
+            # a universe newer than the cached list
+            servers = server_index(
+                self.session, url, self.servers_cache, self.servers_ttl,
+                refresh=True
+            )
+            server = servers.find(self.universe, self.language)
 
-        # Find the matching server and set the server_number and language
-        for server in servers:
-            if server['name'] == self.universe and self.is_pioneer == 1:
-                self.server_number = server['number']
-                self.language = server['language']
-                break
-            elif server['name'] == self.universe:
-                self.server_number = server['number']
-                if self.language is None:
-                    self.language = server['language']
-                break
-            elif server['name'] == self.universe and self.language is None:
-                self.server_number = server['number']
-                break
+        # Set the server_number and language of the matching server
+        if server is not None:
+            self.server_number = server[0]
+            if self.language is None or self.is_pioneer == 1:
+                self.language = server[1]
 
         # Check if the server_number was found, otherwise raise an error
         if self.server_number is None:
@@ -298,14 +728,7 @@ class OGame(object):
 
     def set_server_id(self):
         # Get the accounts
-        if self.is_pioneer == 1:
-            accounts = self.session.get(
-                url='https://lobby-pioneers.ogame.gameforge.com/api/users/me/accounts'
-            ).json()
-        else:
-            accounts = self.session.get(
-                url='https://lobby.ogame.gameforge.com/api/users/me/accounts'
-            ).json()
+        accounts = self._accounts()
 
         # Find the matching account and set the server_id
         for account in accounts:
@@ -359,172 +782,189 @@ class OGame(object):
         return login_link['url']
 
     def test(self):
+        import unittest
         import ogame.test
         ogame.test.UnittestOgame.empire = self
         suite = unittest.TestLoader().loadTestsFromModule(ogame.test)
         return unittest.TextTestRunner(verbosity=2).run(suite).wasSuccessful()
 
     def server(self):
-        class Server:
-            version = self.landing_page.find('meta', {'name': 'ogame-version'})
+        landing = self.landing
+        return Server(
+            version=landing.version,
+            Speed=Speed(
+                universe=landing.universe_speed,
+                fleet=landing.fleet_speed
+            ),
+            Donut=Donut(
+                galaxy=landing.donut_galaxy,
+                system=landing.donut_system
+            )
+        )
 
-            class Speed:
-                universe = self.landing_page.find(
-                    'meta', {'name': 'ogame-universe-speed'}
-                )
-                universe = int(universe['content'])
-                fleet = self.landing_page.find(
-                    'meta', {'name': 'ogame-universe-speed-fleet-peaceful'}
-                )
-                fleet = int(fleet['content'])
-
-            class Donut:
-                galaxy = self.landing_page.find(
-                    'meta', {'name': 'ogame-donut-galaxy'}
-                )['content']
-                if 1 == int(galaxy):
-                    galaxy = True
-                else:
-                    galaxy = False
-                system = self.landing_page.find(
-                    'meta', {'name': 'ogame-donut-system'}
-                )['content']
-                if 1 == int(system):
-                    system = True
+    def event_box(self, refresh=False):
+        snapshot = self.event_box_snapshot
+        if refresh or snapshot is None \
+                or snapshot.age() > self.event_box_ttl:
+            snapshot = self.flight.do(('eventbox',), self._fetch_event_box)
+        return snapshot
+
+    def _fetch_event_box(self):
+        with self.session.priority('events'):
+            response = self.session.get(
+                url=self.index_php + 'page=componentOnly'
+                                     '&component=eventList&action=fetchEventBox&ajax=1&asJson=1',
+                headers={'X-Requested-With': 'XMLHttpRequest'}
+            ).json()
+        self.event_box_snapshot = EventBox(response)
+        return self.event_box_snapshot
+
+    def deadline(self, seconds):
+        return self.session.deadline(seconds)
+
+    def priority(self, name):
+        return self.session.priority(name)
+
+    def _page(self, component, id=None, page='ingame', shared=True):
+        key = (component or page, id)
+        if self.cache is not None:
+            response = self.cache.get(key)
+            if response is not None:
+                return response
+        url = self.index_php + 'page={}'.format(page)
+        if component is not None:
+            url += '&component={}'.format(component)
+        if id is not None:
+            url += '&cp={}'.format(id)
+        if shared:
+            response = self.flight.do(key, lambda: self.session.get(url).text)
+        else:
+            # actions take the token out of the page, it must not be shared
+            response = self.session.get(url).text
+        if self.cache is not None:
+            self.cache.put(key, response)
+        return response
+
+    def _extract(self, component, id, spec=None):
+        # concurrent readers of one page share the download and the parse,
+        # the values are only read
+        spec = spec or component
+        return self.flight.do(
+            (component, id, spec),
+            lambda: page_specs[spec].extract(self._page(component, id), self.parser)
+        )
+
+    def _invalidate(self, action, id=None, component=None):
+        for view in invalidates[action]:
+            if view == 'component':
+                view = component
+            if view == 'research':
+                self.research_state = None
+            if view == 'eventbox':
+                self.event_box_snapshot = None
+            elif view == 'production':
+                if id is None:
+                    self.production_figures.clear()
                 else:
-                    system = False
+                    self.production_figures.pop(id, None)
+            elif view == 'resource_bar':
+                if self.cache is not None:
+                    for page in resource_bar_pages:
+                        self.cache.invalidate(page, id)
+            elif self.cache is not None:
+                self.cache.invalidate(
+                    view, None if view in account_views else id
+                )
 
-        return Server
+    def empire_snapshot(self):
+        celestials = {}
+        planet_types = (0, 1) if self.moon_ids() else (0,)
+        for planet_type in planet_types:
+            response = self.session.get(
+                self.index_php +
+                'page=standalone&component=empire&planetType={}'.format(planet_type)
+            ).text
+            for celestial in empire_celestials(response, planet_type == 1):
+                celestials[celestial.id] = celestial
+        return celestials
+
+    def gather(self, reads, ids=None, workers=8, priority='scan'):
+        for read in reads:
+            if read not in gatherable:
+                raise ValueError(f'{read} can not be gathered')
+        if ids is None:
+            ids = self.planet_ids() + self.moon_ids()
+        results = {id: {} for id in ids}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self._gathered, priority, read, id): (id, read)
+                for id in ids for read in reads
+            }
+            for future in as_completed(futures):
+                id, read = futures[future]
+                try:
+                    results[id][read] = future.result()
+                except Exception as e:
+                    results[id][read] = e
+        return results
 
-    def attacked(self):
-        response = self.session.get(
-            url=self.index_php + 'page=componentOnly'
-                                 '&component=eventList&action=fetchEventBox&ajax=1&asJson=1',
-            headers={'X-Requested-With': 'XMLHttpRequest'}
-        ).json()
-        if 0 < response['hostile']:
-            return True
-        else:
-            return False
+    def _gathered(self, priority, read, id):
+        with self.session.priority(priority):
+            return getattr(self, read)(id)
 
-    def neutral(self):
-        response = self.session.get(
-            url=self.index_php + 'page=componentOnly'
-                                 '&component=eventList&action=fetchEventBox&ajax=1&asJson=1',
-            headers={'X-Requested-With': 'XMLHttpRequest'}
-        ).json()
-        if 0 < response['neutral']:
-            return True
-        else:
-            return False
+    def attacked(self, refresh=False):
+        return 0 < self.event_box(refresh).hostile
 
-    def friendly(self):
-        response = self.session.get(
-            url=self.index_php + 'page=componentOnly'
-                                 '&component=eventList&action=fetchEventBox&ajax=1&asJson=1',
-            headers={'X-Requested-With': 'XMLHttpRequest'}
-        ).json()
-        if 0 < response['friendly']:
-            return True
-        else:
-            return False
+    def neutral(self, refresh=False):
+        return 0 < self.event_box(refresh).neutral
+
+    def friendly(self, refresh=False):
+        return 0 < self.event_box(refresh).friendly
 
     def character_class(self):
-        character = self.landing_page.find_partial(
-            class_='sprite characterclass medium')
-        return character['class'][3]
+        return self.landing.character_class
 
     def rank(self):
-        rank = self.landing_page.find(id='bar')
-        rank = rank.find_all('li')[1].text
-        rank = re.search(r'\((.*)\)', rank).group(1)
-        return int(rank)
+        return self.landing.rank
 
     def planet_ids(self):
-        ids = []
-        for celestial in self.landing_page.find_all(class_='smallplanet'):
-            ids.append(int(celestial['id'].replace('planet-', '')))
-        return ids
+        return list(self.landing.planet_ids)
 
     def planet_names(self):
-        return [planet.text for planet in
-                self.landing_page.find_all(class_='planet-name')]
+        return [self.landing.names[id] for id in self.landing.planet_ids]
 
     def id_by_planet_name(self, name):
-        for planet_name, id in zip(
-                OGame.planet_names(self), OGame.planet_ids(self)
-        ):
-            if planet_name == name:
-                return id
+        return self.landing.planet_by_name.get(name)
 
     def name_by_planet_id(self, id):
-        for _id, planet_name in zip(
-                OGame.planet_ids(self), OGame.planet_names(self)
-        ):
-            if id == _id:
-                return planet_name
+        if id in self.landing.moons:
+            return None
+        return self.landing.names.get(id)
 
     def moon_ids(self):
-        moons = []
-        for moon in self.landing_page.find_all(class_='moonlink'):
-            moon = moon['href']
-            moon = re.search('cp=(.*)', moon).group(1)
-            moons.append(int(moon))
-        return moons
+        return list(self.landing.moon_ids)
 
     def moon_names(self):
-        names = []
-        for name in self.landing_page.find_all(class_='moonlink'):
-            name = name['title']
-            names.append(re.search(r'<b>(.*) \[', name).group(1))
-        return names
+        return [self.landing.names[id] for id in self.landing.moon_ids]
 
     def slot_celestial(self):
-        class Slot:
-            planets = self.landing_page.find(
-                'p',
-                attrs={'class': 'textCenter'}
-            ).find('span').text.split('/')
-            planets = [int(planet) for planet in planets]
-            free = planets[1] - planets[0]
-            total = planets[1]
-
-        return Slot
+        used, total = self.landing.slots
+        return Slots(total=total, free=total - used)
 
     def celestial(self, id):
-        response = self.session.get(
-            url=self.index_php + 'page=ingame&component=overview',
-            params={'cp': id}
-        ).text
-        textContent1 = re.search(
-            r'textContent\[1] = "(.*)km \(<span>(.*)<(.*)<span>(.*)<',
-            response
+        values = self._extract('overview', id)
+        diameter, used, total = values['fields']
+        return Celestial(
+            diameter=diameter,
+            used=used,
+            total=total,
+            free=total - used,
+            temperature=values['temperature'],
+            coordinates=OGame.celestial_coordinates(self, id)
         )
-        textContent3 = re.search(
-            r'textContent\[3] = "(.*)"',
-            response
-        )
-        textContent3 = textContent3.group(1).replace('\\u00b0', '')
-        textContent3 = re.findall(r'\d+(?: \d+)?', textContent3)
-
-        class Celestial:
-            diameter = int(textContent1.group(1).replace('.', ''))
-            used = int(textContent1.group(2))
-            total = int(textContent1.group(4))
-            free = total - used
-            temperature = [
-                textContent3[0],
-                textContent3[1]
-            ]
-            coordinates = OGame.celestial_coordinates(self, id)
-
-        return Celestial
 
     def celestial_queue(self, id):
-        response = self.session.get(
-            url=self.index_php + 'page=ingame&component=overview',
-            params={'cp': id}
-        ).text
+        response = self._page('overview', id)
         research_time = re.search(r'var restTimeresearch = ([0-9]+)', response)
         if research_time is None:
             research_time = datetime.fromtimestamp(0)
@@ -544,82 +984,76 @@ class OGame(object):
             shipyard_time = int(shipyard_time.group(1))
             shipyard_time = datetime.now() + timedelta(seconds=shipyard_time)
 
-        class Queue:
-            research = research_time
-            buildings = build_time
-            shipyard = shipyard_time
-            list = [
-                research,
-                buildings,
-                shipyard
-            ]
-
-        return Queue
+        return Queue(
+            research=research_time,
+            buildings=build_time,
+            shipyard=shipyard_time
+        )
 
     def celestial_coordinates(self, id):
-        for celestial in self.landing_page.find_all(class_='smallplanet'):
-            planet = celestial.find(class_='planetlink')
-            if str(id) in planet['href']:
-                coordinates = re.search(r'\[(.*)]', planet['title']).group(1)
-                coordinates = [int(coords) for coords in coordinates.split(':')]
-                coordinates.append(const.destination.planet)
-                return coordinates
-            moon = celestial.find(class_='moonlink')
-            if moon and str(id) in moon['href']:
-                coordinates = re.search(r'\[(.*)]', moon['title']).group(1)
-                coordinates = [int(coords) for coords in coordinates.split(':')]
-                coordinates.append(const.destination.moon)
-                return coordinates
-
-    def resources(self, id):
-        response = self.session.get(
-            self.index_php + 'page=resourceSettings&cp={}'.format(id)
-        ).text
-        bs4 = BeautifulSoup4(response)
-
-        def to_int(string):
-            return int(float(string.replace('M', '000').replace('n', '')))
-
-        class Resources:
-            resources = [bs4.find(id='resources_metal')['data-raw'],
-                         bs4.find(id='resources_crystal')['data-raw'],
-                         bs4.find(id='resources_deuterium')['data-raw']]
-            resources = [to_int(resource) for resource in resources]
-            metal = resources[0]
-            crystal = resources[1]
-            deuterium = resources[2]
-            day_production = bs4.find(
-                'tr',
-                attrs={'class': 'summary'}
-            ).find_all(
-                'td',
-                attrs={'class': 'undermark'}
+        coordinates = self.landing.coordinates.get(id)
+        if coordinates is not None:
+            return list(coordinates)
+
+    def resources(self, id, production=False):
+        if production:
+            response = self._page(None, id, page='resourceSettings')
+            resources = self._resources(response)
+            self.production_figures[id] = (
+                time.monotonic() + self.production_ttl,
+                resources.day_production,
+                resources.storage
             )
-            day_production = [
-                int(day_production[0].span['title'].replace('.', '')),
-                int(day_production[1].span['title'].replace('.', '')),
-                int(day_production[2].span['title'].replace('.', ''))
-            ]
-            storage = bs4.find_all('tr')
-            for stor in storage:
-                if len(stor.find_all('td', attrs={'class': 'left2'})) != 0:
-                    storage = stor.find_all('td', attrs={'class': 'left2'})
-                    break
-            storage = [
-                int(storage[0].span['title'].replace('.', '')),
-                int(storage[1].span['title'].replace('.', '')),
-                int(storage[2].span['title'].replace('.', ''))
-            ]
-            darkmatter = to_int(bs4.find(id='resources_darkmatter')['data-raw'])
-            energy = to_int(bs4.find(id='resources_energy')['data-raw'])
+            return resources
+        values = self._resource_bar(id)
+        figures = self.production_figures.get(id)
+        if figures is not None and figures[0] > time.monotonic():
+            day_production, storage = figures[1], figures[2]
+        else:
+            day_production = storage = None
+        return Resources(
+            resources=[values['metal'], values['crystal'], values['deuterium']],
+            metal=values['metal'],
+            crystal=values['crystal'],
+            deuterium=values['deuterium'],
+            day_production=day_production,
+            storage=storage,
+            darkmatter=values['darkmatter'],
+            energy=values['energy']
+        )
 
-        return Resources
+    def _resource_bar(self, id):
+        if self.cache is not None:
+            response = self.cache.latest(id, resource_bar_pages)
+            if response is not None:
+                return page_specs['resourceBar'].extract(response, self.parser)
+        response = self.flight.do(
+            ('fetchResources', id),
+            lambda: self.session.get(
+                url=self.index_php + 'page=fetchResources&cp={}&ajax=1'.format(id),
+                headers={'X-Requested-With': 'XMLHttpRequest'}
+            ).json()
+        )
+        return fetched_resources(response)
+
+    def _resources(self, response):
+        values = page_specs['resourceSettings'].extract(response, self.parser)
+        return Resources(
+            resources=[values['metal'], values['crystal'], values['deuterium']],
+            metal=values['metal'],
+            crystal=values['crystal'],
+            deuterium=values['deuterium'],
+            day_production=values['day_production'][:3],
+            storage=values['storage'][:3],
+            darkmatter=values['darkmatter'],
+            energy=values['energy']
+        )
 
     def resources_settings(self, planet_id, settings=None):
-        response = self.session.get(
-            self.index_php + 'page=ingame&component=resourcesettings&cp={}'.format(planet_id)
-        ).text
-        bs4 = BeautifulSoup4(response)
+        response = self._page(
+            'resourcesettings', planet_id, shared=settings is None
+        )
+        bs4 = BeautifulSoup4(response, self.parser)
         settings_form = {
             'saveSettings': 1,
         }
@@ -641,6 +1075,7 @@ class OGame(object):
                 self.index_php + 'page=resourceSettings&cp={}'.format(id),
                 data=settings_form
             )
+            self._invalidate('resources_settings', planet_id)
         settings_data = {}
         for key, value in settings_form.items():
             if key in names:
@@ -650,21 +1085,7 @@ class OGame(object):
                 )
                 settings_data[building_name] = value
 
-        class Settings:
-            metal_mine = settings_data['metal_mine']
-            crystal_mine = settings_data['crystal_mine']
-            deuterium_mine = settings_data['deuterium_mine']
-            solar_plant = settings_data['solar_plant']
-            fusion_plant = settings_data['fusion_plant']
-            solar_satellite = settings_data['solar_satellite']
-            crawler = settings_data['crawler']
-            list = [
-                metal_mine, crystal_mine, deuterium_mine,
-                solar_plant, fusion_plant, solar_satellite,
-                crawler
-            ]
-
-        return Settings
+        return Settings(**settings_data)
 
     def isPossible(self: str):
         if self == 'on':
@@ -679,248 +1100,81 @@ class OGame(object):
             return False
 
     def supply(self, id):
-        response = self.session.get(
-            url=self.index_php + 'page=ingame&component=supplies&cp={}'
-            .format(id)
-        ).text
-        bs4 = BeautifulSoup4(response)
-        levels = [
-            int(level['data-value'])
-            for level in bs4.find_all('span', {'data-value': True})
-        ]
-        technologyStatus = [
-            status['data-status']
-            for status in bs4.find_all('li', {'class': 'technology'})
-        ]
-
-        class Supply:
-            def __init__(self, i):
-                self.level = levels[i]
-                self.is_possible = OGame.isPossible(technologyStatus[i])
-                self.in_construction = OGame.inConstruction(technologyStatus[i])
-
-        class Supplies(object):
-            metal_mine = Supply(0)
-            crystal_mine = Supply(1)
-            deuterium_mine = Supply(2)
-            solar_plant = Supply(3)
-            fusion_plant = Supply(4)
-            metal_storage = Supply(7)
-            crystal_storage = Supply(8)
-            deuterium_storage = Supply(9)
-
-        return Supplies
+        return technologies_record(
+            Supplies, self._extract('supplies', id)
+        )
 
     def facilities(self, id):
-        response = self.session.get(
-            self.index_php + 'page=ingame&component=facilities&cp={}'
-            .format(id)
-        ).text
-        bs4 = BeautifulSoup4(response)
-        levels = [
-            int(level['data-value'])
-            for level in bs4.find_all(
-                'span', {'class': 'level', 'data-value': True}
-            )
-        ]
-        technologyStatus = [
-            status['data-status']
-            for status in bs4.find_all('li', {'class': 'technology'})
-        ]
-
-        class Facility:
-            def __init__(self, i):
-                self.level = levels[i]
-                self.is_possible = OGame.isPossible(technologyStatus[i])
-                self.in_construction = OGame.inConstruction(technologyStatus[i])
-
-        class Facilities(object):
-            robotics_factory = Facility(0)
-            shipyard = Facility(1)
-            research_laboratory = Facility(2)
-            alliance_depot = Facility(3)
-            missile_silo = Facility(4)
-            nanite_factory = Facility(5)
-            terraformer = Facility(6)
-            repair_dock = Facility(7)
-
-        return Facilities
+        return technologies_record(
+            Facilities, self._extract('facilities', id)
+        )
 
     def moon_facilities(self, id):
-        response = self.session.get(
-            url='{}page=ingame&component=facilities&cp={}'
-            .format(self.index_php, id)
-        ).text
-        bs4 = BeautifulSoup4(response)
-        levels = [
-            int(level['data-value'])
-            for level in bs4.find_all(class_=['targetlevel', 'level']) if level.get('data-value')
-        ]
-        technologyStatus = [
-            status['data-status']
-            for status in bs4.find_all('li', {'class': 'technology'})
-        ]
+        return technologies_record(
+            MoonFacilities, self._extract('facilities', id, 'moon_facilities')
+        )
 
-        class Facility:
-            def __init__(self, i):
-                self.level = levels[i]
-                self.is_possible = OGame.isPossible(technologyStatus[i])
-                self.in_construction = OGame.inConstruction(technologyStatus[i])
+    def traider(self, id):
+        raise NotImplementedError("function not implemented yet PLS contribute")
 
-        class Facilities(object):
-            robotics_factory = Facility(0)
-            shipyard = Facility(1)
-            moon_base = Facility(2)
-            sensor_phalanx = Facility(3)
-            jump_gate = Facility(4)
+    def research(self, id=None, refresh=False):
+        return self._research_state(id, refresh)[1]
 
-        return Facilities
+    def research_end(self, refresh=False):
+        return self._research_state(None, refresh)[2]
 
-    def traider(self, id):
-        raise NotImplementedError("function not implemented yet PLS contribute")
+    def _research_state(self, id, refresh):
+        # levels are account wide, one cached record serves every planet
+        state = self.research_state
+        now = time.monotonic()
+        if refresh or state is None or state[0] <= now \
+                or (state[2] is not None and state[2] <= datetime.now()):
+            state = self.flight.do(
+                ('research',), lambda: self._fetch_research(id)
+            )
+        return state
 
-    def research(self, id=None):
+    def _fetch_research(self, id):
         if id is None:
             id = self.planet_ids()[0]
-        response = self.session.get(
-            url=self.index_php,
-            params={'page': 'ingame', 'component': 'research',
-                    'cp': id}
-        ).text
-        bs4 = BeautifulSoup4(response)
-        levels = [
-            int(level['data-value'])
-            for level in bs4.find_all(
-                'span', {'class': 'level', 'data-value': True}
-            )
-        ]
-        technologyStatus = [
-            status['data-status']
-            for status in bs4.find_all('li', {'class': 'technology'})
-        ]
-
-        class Research:
-            def __init__(self, i):
-                self.level = levels[i]
-                self.is_possible = OGame.isPossible(technologyStatus[i])
-                self.in_construction = OGame.inConstruction(technologyStatus[i])
-
-        class Researches(object):
-            energy = Research(0)
-            laser = Research(1)
-            ion = Research(2)
-            hyperspace = Research(3)
-            plasma = Research(4)
-            combustion_drive = Research(5)
-            impulse_drive = Research(6)
-            hyperspace_drive = Research(7)
-            espionage = Research(8)
-            computer = Research(9)
-            astrophysics = Research(10)
-            research_network = Research(11)
-            graviton = Research(12)
-            weapons = Research(13)
-            shielding = Research(14)
-            armor = Research(15)
-
-        return Researches
+        response = self._page('research', id)
+        values = page_specs['research'].extract(response, self.parser)
+        self.research_state = (
+            time.monotonic() + self.research_ttl,
+            technologies_record(Researches, values),
+            values['end']
+        )
+        return self.research_state
 
     def ships(self, id):
-        response = self.session.get(
-            self.index_php + 'page=ingame&component=shipyard&cp={}'
-            .format(id)
-        ).text
-        bs4 = BeautifulSoup4(response)
-        ships_amount = [
-            int(level['data-value'])
-            for level in bs4.find_all(class_='amount')
-        ]
-        technologyStatus = [
-            status['data-status']
-            for status in bs4.find_all('li', {'class': 'technology'})
-        ]
-
-        class Ship:
-            def __init__(self, i):
-                self.amount = ships_amount[i]
-                self.is_possible = OGame.isPossible(technologyStatus[i])
-                self.in_construction = OGame.inConstruction(technologyStatus[i])
-
-        class Crawler:
-            if id not in OGame.moon_ids(self):
-                amount = ships_amount[16]
-                self.is_possible = OGame.isPossible(technologyStatus[16])
-                self.in_construction = OGame.inConstruction(
-                    technologyStatus[16]
-                )
-            else:
-                amount = 0
-                is_possible = False
-                in_construction = False
-
-        class Ships(object):
-            light_fighter = Ship(0)
-            heavy_fighter = Ship(1)
-            cruiser = Ship(2)
-            battleship = Ship(3)
-            interceptor = Ship(4)
-            bomber = Ship(5)
-            destroyer = Ship(6)
-            deathstar = Ship(7)
-            reaper = Ship(8)
-            explorer = Ship(9)
-            small_transporter = Ship(10)
-            large_transporter = Ship(11)
-            colonyShip = Ship(12)
-            recycler = Ship(13)
-            espionage_probe = Ship(14)
-            solarSatellite = Ship(15)
-            crawler = Crawler
-
-        return Ships
+        return technologies_record(
+            Ships, self._extract('shipyard', id)
+        )
 
     def defences(self, id):
-        response = self.session.get(
-            self.index_php + 'page=ingame&component=defenses&cp={}'
-            .format(id)
-        ).text
-        bs4 = BeautifulSoup4(response)
-        defences_amount = [
-            int(level['data-value'])
-            for level in bs4.find_all(class_='amount')
-        ]
-        technologyStatus = [
-            status['data-status']
-            for status in bs4.find_all('li', {'class': 'technology'})
-        ]
-
-        class Defence:
-            def __init__(self, i):
-                self.amount = defences_amount[i]
-                self.is_possible = OGame.isPossible(technologyStatus[i])
-                self.in_construction = OGame.inConstruction(technologyStatus[i])
-
-        class Defences(object):
-            rocket_launcher = Defence(0)
-            laser_cannon_light = Defence(1)
-            laser_cannon_heavy = Defence(2)
-            gauss_cannon = Defence(3)
-            ion_cannon = Defence(4)
-            plasma_cannon = Defence(5)
-            shield_dome_small = Defence(6)
-            shield_dome_large = Defence(7)
-            missile_interceptor = Defence(8)
-            missile_interplanetary = Defence(9)
-
-        return Defences
+        return technologies_record(
+            Defences, self._extract('defenses', id)
+        )
 
     def galaxy(self, coords):
-        response = self.session.post(
-            url=self.index_php + 'page=ingame&component=galaxyContent&ajax=1',
-            data={'galaxy': coords[0], 'system': coords[1]},
-            headers={'X-Requested-With': 'XMLHttpRequest'}
-        ).json()
-        bs4 = BeautifulSoup4(response['galaxy'])
+        return list(self.flight.do(
+            ('galaxy', coords[0], coords[1]),
+            lambda: self._galaxy(self._galaxy_content(coords)['galaxy'], coords)
+        ))
+
+    def _galaxy_content(self, coords):
+        with self.session.priority('scan'):
+            return self.flight.do(
+                ('galaxyContent', coords[0], coords[1]),
+                lambda: self.session.post(
+                    url=self.index_php + 'page=ingame&component=galaxyContent&ajax=1',
+                    data={'galaxy': coords[0], 'system': coords[1]},
+                    headers={'X-Requested-With': 'XMLHttpRequest'}
+                ).json()
+            )
+
+    def _galaxy(self, response, coords):
+        bs4 = BeautifulSoup4(response, self.parser)
 
         def playerId(tag):
             numbers = re.search(r'[0-9]+', tag).group()
@@ -973,31 +1227,22 @@ class OGame(object):
             alliance_id = playerId(
                 alliance_id['rel']) if alliance_id else None
 
-            class Position:
-                position = planet_cord
-                name = row.find(id=re.compile(r'planet[0-9]+')).h1.span.text
-                player = player_name[pid]
-                player_id = pid
-                rank = player_rank.get(pid)
-                status = planet_status
-                moon = moon_pos is not None
-                alliance = alliance_name.get(alliance_id)
-                list = [
-                    name, position, player,
-                    player_id, rank, status, moon, alliance
-                ]
-
-            planets.append(Position)
+            planets.append(Position(
+                name=row.find(id=re.compile(r'planet[0-9]+')).h1.span.text,
+                position=planet_cord,
+                player=player_name[pid],
+                player_id=pid,
+                rank=player_rank.get(pid),
+                status=planet_status,
+                moon=moon_pos is not None,
+                alliance=alliance_name.get(alliance_id)
+            ))
 
         return planets
 
     def galaxy_debris(self, coords):
-        response = self.session.post(
-            url=self.index_php + 'page=ingame&component=galaxyContent&ajax=1',
-            data={'galaxy': coords[0], 'system': coords[1]},
-            headers={'X-Requested-With': 'XMLHttpRequest'}
-        ).json()
-        bs4 = BeautifulSoup4(response['galaxy'])
+        response = self._galaxy_content(coords)
+        bs4 = BeautifulSoup4(response['galaxy'], self.parser)
         debris_fields = []
         debris_rows = bs4.find_all('td', {'class': 'debris'})
         for row in debris_rows:
@@ -1021,45 +1266,27 @@ class OGame(object):
                     0
                 ]
 
-            class Position:
-                position = debris_cord
-                has_debris = debris
-                resources = debris_resources
-                metal = resources[0]
-                crystal = resources[1]
-                deuterium = resources[2]
-                list = [
-                    position, has_debris, resources,
-                    metal, crystal, deuterium
-                ]
-
-            if len(coords) >= 3 and coords[2] == Position.position[2]:
-                return Position
-            debris_fields.append(Position)
+            position = Debris(
+                position=debris_cord,
+                has_debris=debris,
+                resources=debris_resources,
+                metal=debris_resources[0],
+                crystal=debris_resources[1],
+                deuterium=debris_resources[2]
+            )
+            if len(coords) >= 3 and coords[2] == position.position[2]:
+                return position
+            debris_fields.append(position)
         return debris_fields
 
     def ally(self):
-        alliance = self.landing_page.find(name='ogame-alliance-name')
-        if alliance:
-            return alliance
+        if self.landing.alliance:
+            return self.landing.alliance
         else:
             return []
 
     def officers(self):
-        commander_element = self.landing_page.find_partial(class_='on commander')
-        admiral_element = self.landing_page.find_partial(class_='on admiral')
-        engineer_element = self.landing_page.find_partial(class_='on engineer')
-        geologist_element = self.landing_page.find_partial(class_='on geologist')
-        technocrat_element = self.landing_page.find_partial(class_='on technocrat')
-
-        class Officers(object):
-            commander = commander_element is not None
-            admiral = admiral_element is not None
-            engineer = engineer_element is not None
-            geologist = geologist_element is not None
-            technocrat = technocrat_element is not None
-
-        return Officers
+        return Officers(**self.landing.officers)
 
     def shop(self):
         raise NotImplementedError("function not implemented yet PLS contribute")
@@ -1089,50 +1316,46 @@ class OGame(object):
         return coordinates
 
     def slot_fleet(self):
-        response = self.session.get(
-            self.index_php + 'page=ingame&component=fleetdispatch'
-        ).text
-        bs4 = BeautifulSoup4(response)
-        slots = bs4.find('div', attrs={'id': 'slots', 'class': 'fleft'})
-        slots = [
-            slot.text
-            for slot in slots.find_all(class_='fleft')
-        ]
-        fleet = re.search(':(.*)/(.*)', slots[0])
+        response = self._page('fleetdispatch')
+        return self._slot_fleet(response)
+
+    def _slot_fleet(self, response):
+        slots = page_specs['fleetdispatch'].extract(response, self.parser)['slots']
+        fleet = fleet_slots.search(slots[0])
         fleet = [fleet.group(1), fleet.group(2)]
-        expedition = re.search(' (.*)/(.*)\\n', slots[1])
+        expedition = expedition_slots.search(slots[1])
         expedition = [
             expedition.group(1).replace(' ', ''),
             expedition.group(2)
         ]
 
-        class Fleet:
-            total = int(fleet[1])
-            free = total - int(fleet[0])
-
-        class Expedition:
-            total = int(expedition[1])
-            free = total - int(expedition[0])
-
-        class Slot:
-            fleet = Fleet
-            expedition = Expedition
-
-        return Slot
+        return FleetSlots(
+            fleet=Slots(
+                total=int(fleet[1]),
+                free=int(fleet[1]) - int(fleet[0])
+            ),
+            expedition=Slots(
+                total=int(expedition[1]),
+                free=int(expedition[1]) - int(expedition[0])
+            )
+        )
 
-    def fleet(self):
+    def fleet(self, refresh=False):
+        self.event_box(refresh)
         fleets = []
         fleets.extend(self.hostile_fleet())
         fleets.extend(self.friendly_fleet())
         return fleets
 
-    def friendly_fleet(self):
-        if not self.friendly():
+    def friendly_fleet(self, refresh=False):
+        if not self.friendly(refresh):
             return []
-        response = self.session.get(
-            self.index_php + 'page=ingame&component=movement'
-        ).text
-        bs4 = BeautifulSoup4(response)
+        with self.session.priority('events'):
+            response = self._page('movement')
+        return self._friendly_fleet(response)
+
+    def _friendly_fleet(self, response):
+        bs4 = BeautifulSoup4(response, self.parser)
         fleetDetails = bs4.find_all(class_='fleetDetails')
         fleet_ids = bs4.find_all_partial(id='fleet')
         fleet_ids = [id['id'] for id in fleet_ids]
@@ -1163,29 +1386,30 @@ class OGame(object):
 
         fleets = []
         for i in range(len(fleet_ids)):
-            class Fleets:
-                id = fleet_ids[i]
-                mission = mission_types[i]
-                diplomacy = const.diplomacy.friendly
-                player_name = self.player
-                player_id = self.player_id
-                returns = return_flights[i]
-                arrival = arrival_times[i]
-                origin = origins[i]
-                destination = destinations[i]
-                list = [id, mission, diplomacy, player_name, player_id, returns,
-                        arrival, origin, destination]
-
-            fleets.append(Fleets)
+            fleets.append(Fleet(
+                id=fleet_ids[i],
+                mission=mission_types[i],
+                diplomacy=const.diplomacy.friendly,
+                player_name=self.player,
+                player_id=self.player_id,
+                returns=return_flights[i],
+                arrival=arrival_times[i],
+                origin=origins[i],
+                destination=destinations[i]
+            ))
         return fleets
 
-    def hostile_fleet(self):
-        if not self.attacked():
+    def hostile_fleet(self, refresh=False):
+        if not self.attacked(refresh):
             return []
-        response = self.session.get(
-            url=self.index_php + 'page=componentOnly&component=eventList'
-        ).text
-        bs4 = BeautifulSoup4(response)
+        with self.session.priority('events'):
+            response = self.session.get(
+                url=self.index_php + 'page=componentOnly&component=eventList'
+            ).text
+        return self._hostile_fleet(response)
+
+    def _hostile_fleet(self, response):
+        bs4 = BeautifulSoup4(response, self.parser)
 
         eventFleet = bs4.find_all('span', class_='hostile')
         eventFleet = [child.parent.parent for child in eventFleet]
@@ -1219,22 +1443,17 @@ class OGame(object):
 
         fleets = []
         for i in range(len(fleet_ids)):
-            class Fleets:
-                id = fleet_ids[i]
-                mission = 1
-                diplomacy = const.diplomacy.hostile
-                player_name = player_names[i]
-                player_id = player_ids[i]
-                returns = False
-                arrival = arrival_times[i]
-                origin = origins[i]
-                destination = destinations[i]
-                list = [
-                    id, mission, diplomacy, player_name, player_id, returns,
-                    arrival, origin, destination
-                ]
-
-            fleets.append(Fleets)
+            fleets.append(Fleet(
+                id=fleet_ids[i],
+                mission=1,
+                diplomacy=const.diplomacy.hostile,
+                player_name=player_names[i],
+                player_id=player_ids[i],
+                returns=False,
+                arrival=arrival_times[i],
+                origin=origins[i],
+                destination=destinations[i]
+            ))
         return fleets
 
     def phalanx(self, coordinates, id):
@@ -1338,6 +1557,10 @@ class OGame(object):
             return False
 
     def spyreports(self, firstpage=1, lastpage=30):
+        with self.session.priority('scan'):
+            return self._spyreports(firstpage, lastpage)
+
+    def _spyreports(self, firstpage, lastpage):
         report_links = []
         while firstpage <= lastpage:
             try:
@@ -1353,215 +1576,234 @@ class OGame(object):
             except Exception as e:
                 print(e)
                 break
-            bs4 = BeautifulSoup4(response)
-            for link in bs4.find_all_partial(href='page=messages&messageId'):
-                if link['href'] not in report_links:
-                    report_links.append(link['href'])
+            for link in self._report_links(response):
+                if link not in report_links:
+                    report_links.append(link)
             firstpage += 1
         reports = []
         for link in report_links:
             response = self.session.get(link).text
-            bs4 = BeautifulSoup4(response)
-            resources_list = bs4.find('ul', {'data-type': 'resources'})
-            if resources_list is None:
-                continue
-            planet_coords = bs4.find('span', 'msg_title').find('a')
-            if planet_coords is None:
-                continue
-            planet_coords = re.search(r'(.*?) (\[(.*?)])', planet_coords.text)
-            report_datetime = bs4.find('span', 'msg_date').text
-            api_code = bs4.find('span', 'icon_apikey')['title']
-            resources_data = {}
-            for resource in resources_list.find_all('li'):
-                resource_name = resource.find('div')['class']
-                resource_name.remove('resourceIcon')
-                resources_data[resource_name[0]] = int(resource['title'].replace('.', ''))
-
-            def get_tech_and_quantity(tech_type):
-                tech_list = bs4.find('ul', {'data-type': tech_type})
-                for tech in tech_list.find_all('li', {'class': 'detail_list_el'}):
-                    tech_id = int(re.search(r'([0-9]+)', tech.find('img')['class'][0]).group(1))
-                    tech_amount = int(tech.find('span', 'fright').text.replace('.', ''))
-                    yield (tech_id, tech_amount)
-
-            spied_data = {'ships': {}, 'defense': {}, 'buildings': {}, 'research': {}}
-            const_data = {
-                'ships': [const.ships.ship_name, 'shipyard'],
-                'defense': [const.buildings.defense_name, 'defenses'],
-                'buildings': [const.buildings.building_name, None],
-                'research': [const.research.research_name, 'research']
-            }
-            for tech_type in spied_data.keys():
-                for tech_id, tech_amount in get_tech_and_quantity(tech_type):
-                    if tech_type == 'ships' and tech_id in [212, 217]:
-                        tech_name = const.buildings.building_name(
-                            (tech_id, None, None)
-                        )
-                    else:
-                        tech_name = const_data[tech_type][0](
-                            (tech_id, None, const_data[tech_type][1])
-                        )
-                    spied_data[tech_type].update({tech_name: tech_amount})
-
-            class Report:
-                name = planet_coords.group(1)
-                position = const.convert_to_coordinates(planet_coords.group(2))
-                moon = bs4.find('figure', 'moon') is not None
-                datetime = report_datetime
-                metal = resources_data['metal']
-                crystal = resources_data['crystal']
-                deuterium = resources_data['deuterium']
-                resources = [metal, crystal, deuterium]
-                fleet = spied_data['ships']
-                defenses = spied_data['defense']
-                buildings = spied_data['buildings']
-                research = spied_data['research']
-                api = re.search(r'value=\'(.+?)\'', api_code).group(1)
-                list = [
-                    name, position, moon, datetime, metal,
-                    crystal, deuterium, resources, fleet,
-                    defenses, buildings, research, api
-                ]
-
-            reports.append(Report)
+            report = self._spyreport(response)
+            if report is not None:
+                reports.append(report)
         return reports
 
+    def _report_links(self, response):
+        bs4 = BeautifulSoup4(response, self.parser)
+        return [
+            link['href']
+            for link in bs4.find_all_partial(href='page=messages&messageId')
+        ]
+
+    def _spyreport(self, response):
+        bs4 = BeautifulSoup4(response, self.parser)
+        resources_list = bs4.find('ul', {'data-type': 'resources'})
+        if resources_list is None:
+            return None
+        planet_coords = bs4.find('span', 'msg_title').find('a')
+        if planet_coords is None:
+            return None
+        planet_coords = re.search(r'(.*?) (\[(.*?)])', planet_coords.text)
+        report_datetime = bs4.find('span', 'msg_date').text
+        api_code = bs4.find('span', 'icon_apikey')['title']
+        resources_data = {}
+        for resource in resources_list.find_all('li'):
+            resource_name = resource.find('div')['class']
+            resource_name.remove('resourceIcon')
+            resources_data[resource_name[0]] = int(resource['title'].replace('.', ''))
+
+        def get_tech_and_quantity(tech_type):
+            tech_list = bs4.find('ul', {'data-type': tech_type})
+            for tech in tech_list.find_all('li', {'class': 'detail_list_el'}):
+                tech_id = int(re.search(r'([0-9]+)', tech.find('img')['class'][0]).group(1))
+                tech_amount = int(tech.find('span', 'fright').text.replace('.', ''))
+                yield (tech_id, tech_amount)
+
+        spied_data = {'ships': {}, 'defense': {}, 'buildings': {}, 'research': {}}
+        const_data = {
+            'ships': [const.ships.ship_name, 'shipyard'],
+            'defense': [const.buildings.defense_name, 'defenses'],
+            'buildings': [const.buildings.building_name, None],
+            'research': [const.research.research_name, 'research']
+        }
+        for tech_type in spied_data.keys():
+            for tech_id, tech_amount in get_tech_and_quantity(tech_type):
+                if tech_type == 'ships' and tech_id in [212, 217]:
+                    tech_name = const.buildings.building_name(
+                        (tech_id, None, None)
+                    )
+                else:
+                    tech_name = const_data[tech_type][0](
+                        (tech_id, None, const_data[tech_type][1])
+                    )
+                spied_data[tech_type].update({tech_name: tech_amount})
+
+        return Report(
+            name=planet_coords.group(1),
+            position=const.convert_to_coordinates(planet_coords.group(2)),
+            moon=bs4.find('figure', 'moon') is not None,
+            datetime=report_datetime,
+            metal=resources_data['metal'],
+            crystal=resources_data['crystal'],
+            deuterium=resources_data['deuterium'],
+            resources=[
+                resources_data['metal'],
+                resources_data['crystal'],
+                resources_data['deuterium']
+            ],
+            fleet=spied_data['ships'],
+            defenses=spied_data['defense'],
+            buildings=spied_data['buildings'],
+            research=spied_data['research'],
+            api=re.search(r'value=\'(.+?)\'', api_code).group(1)
+        )
+
     def send_fleet(
             self,
             mission,
             id,
             where,
             ships,
-            resources=(0, 0, 0), speed=10, holdingtime=0
+            resources=(0, 0, 0), speed=10, holdingtime=0, deadline=None
     ):
-        response = self.session.get(
-            url=self.index_php + 'page=ingame&component=fleetdispatch&cp={}'
-            .format(id)
-        ).text
-        send_fleet_token = re.search('var fleetSendingToken = "(.*)"', response)
-        if send_fleet_token is None:
-            send_fleet_token = re.search('var token = "(.*)"', response)
-        form_data = {'token': send_fleet_token.group(1)}
-        for ship in ships:
-            ship_type = 'am{}'.format(ship[0])
-            form_data.update({ship_type: ship[1]})
-        form_data.update(
-            {
-                'galaxy': where[0],
-                'system': where[1],
-                'position': where[2],
-                'type': where[3],
-                'metal': resources[0],
-                'crystal': resources[1],
-                'deuterium': resources[2],
-                'prioMetal': 1,
-                'prioCrystal': 2,
-                'prioDeuterium': 3,
-                'mission': mission,
-                'speed': speed,
-                'retreatAfterDefenderRetreat': 0,
-                'union': 0,
-                'holdingtime': holdingtime
-            }
-        )
-        response = self.session.post(
-            url=self.index_php + 'page=ingame&component=fleetdispatch'
-                                 '&action=sendFleet&ajax=1&asJson=1',
-            data=form_data,
-            headers={'X-Requested-With': 'XMLHttpRequest'}
-        ).json()
-        return response['success']
+        with self.session.deadline(deadline), self.session.priority('fleet'):
+            response = self._page('fleetdispatch', id, shared=False)
+            form_data = fleet_form(
+                response, mission, where, ships, resources, speed, holdingtime
+            )
+            # cp pins the planet, the session's current planet moves with every
+            # page another thread downloads
+            response = self.session.post(
+                url=self.index_php + 'page=ingame&component=fleetdispatch'
+                                     '&action=sendFleet&ajax=1&asJson=1'
+                                     '&cp={}'.format(id),
+                data=form_data,
+                headers={'X-Requested-With': 'XMLHttpRequest'}
+            ).json()
+            self._invalidate('send_fleet', id)
+            return response['success']
+
+    def return_fleet(self, fleet_id, deadline=None):
+        with self.session.deadline(deadline), self.session.priority('fleet'):
+            response = self._page('movement', shared=False)
+            token = return_token(response, fleet_id)
+            if token is not None:
+                self.session.get(
+                    url=''.join([
+                        self.index_php,
+                        'page=ingame&component=movement&return={}&token={}'
+                        .format(fleet_id, token)
+                    ])
+                )
+                self._invalidate('return_fleet')
+                return True
+            else:
+                return False
 
-    def return_fleet(self, fleet_id):
-        response = self.session.get(
-            url=self.index_php + 'page=ingame&component=movement'
-        ).text
-        if "return={}".format(fleet_id) in response:
-            token = re.search(
-                'return={}'.format(fleet_id) + '&amp;token=(.*)" ', response
-            ).group(1).split('"')[0]
-            self.session.get(
-                url=''.join([
-                    self.index_php,
-                    'page=ingame&component=movement&return={}&token={}'
-                    .format(fleet_id, token)
-                ])
+    def page_snapshot(self, component, id):
+        spec = component
+        if component == 'facilities' and id in self.moon_ids():
+            spec = 'moon_facilities'
+        response = self._page(component, id, shared=False)
+        return PageSnapshot(component, id, response, self.parser, spec)
+
+    def _snapshot(self, snapshot, component, id):
+        if snapshot is None:
+            return self.page_snapshot(component, id)
+        if snapshot.component != component or snapshot.id != id:
+            raise ValueError(
+                f'Snapshot of {snapshot.component} {snapshot.id} given for '
+                f'{component} {id}'
             )
-            return True
-        else:
-            return False
+        return snapshot
 
-    def build(self, what, planet_id):
+    def build(self, what, planet_id, deadline=None, snapshot=None):
+        with self.session.deadline(deadline):
+            return self._schedule(what, planet_id, snapshot)[0]
+
+    def _schedule(self, what, planet_id, snapshot=None):
         type = what[0]
         amount = what[1]
         component = what[2]
-        response = self.session.get(
-            url=self.index_php +
-                'page=ingame&component={}&cp={}'
-                .format(component, planet_id)
-        ).text
-
-        build_token = re.search(r'var token\s?=\s?"([^"]*)";', response).group(1)
+        snapshot = self._snapshot(snapshot, component, planet_id)
 
         params = {
             'technologyId': type,
             'amount': amount,
             'mode': 1,
-            'token': build_token
+            'token': snapshot.token
         }
 
-        self.session.post(
+        # cp pins the planet, the session's current planet moves with every
+        # page another thread downloads
+        response = self.session.post(
             url=self.index_php +
-                'page=componentOnly&component=buildlistactions&action=scheduleEntry&asJson=1',
+                'page=componentOnly&component=buildlistactions&action=scheduleEntry&asJson=1'
+                '&cp={}'.format(planet_id),
             data=params,
             headers={'X-Requested-With': 'XMLHttpRequest'}
         )
-
-    def deconstruct(self, what, id):
+        renewed = snapshot.renew_token(response)
+        self._invalidate('build', planet_id, component)
+        return schedule_result(response) + (snapshot if renewed else None,)
+
+    def build_many(self, orders, workers=4):
+        # orders for the same page of a planet run in sequence so each can
+        # use the token the previous answer handed back
+        groups = OrderedDict()
+        for index, (what, planet_id) in enumerate(orders):
+            groups.setdefault((planet_id, what[2]), []).append(index)
+        results = [None] * len(orders)
+
+        def schedule(indexes):
+            snapshot = None
+            for index in indexes:
+                what, planet_id = orders[index]
+                try:
+                    success, error, snapshot = self._schedule(
+                        what, planet_id, snapshot
+                    )
+                except Exception as e:
+                    success, error, snapshot = False, f'{type(e).__name__}: {e}', None
+                results[index] = BuildResult(what, planet_id, success, error)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [
+                executor.submit(schedule, indexes) for indexes in groups.values()
+            ]:
+                future.result()
+        return results
+
+    def deconstruct(self, what, id, snapshot=None):
         type = what[0]
         component = what[2]
         cant_deconstruct = [34, 33, 36, 41, 212, 217]
         if component not in ['supplies', 'facilities'] or type in cant_deconstruct:
             return
-        response = self.session.get(
-            url=self.index_php +
-                'page=ingame&component={}&cp={}'
-                .format(component, id)
-        ).text
-        deconstruct_token = re.search(
-            r"var downgradeEndpoint = (.*)token=(.*)\&",
-            response
-        ).group(2)
+        snapshot = self._snapshot(snapshot, component, id)
         self.session.get(
             url=self.index_php,
             params={'page': 'ingame',
                     'component': component,
                     'modus': 3,
-                    'token': deconstruct_token,
-                    'type': type}
+                    'token': snapshot.downgrade_token,
+                    'type': type,
+                    'cp': id}
         )
+        self._invalidate('deconstruct', id, component)
 
-    def cancel_building(self, id):
-        self.cancel('building', id)
+    def cancel_building(self, id, snapshot=None):
+        self.cancel('building', id, snapshot)
 
-    def cancel_research(self, id):
-        self.cancel('research', id)
+    def cancel_research(self, id, snapshot=None):
+        self.cancel('research', id, snapshot)
 
-    def cancel(self, what_queue, id):
-        response = self.session.get(
-            url=self.index_php + 'page=ingame&component=overview',
-            params={'cp': id}
-        ).text
-        cancel_token = re.search(
-            rf"var cancelLink{what_queue} = (.*)token=(.*)\&",
-            response
-        ).group(2)
-        parameters = re.search(
-            rf"\"cancel{what_queue}\((.*)\, (.*)\,",
-            response
-        )
-        if parameters is None:
+    def cancel(self, what_queue, id, snapshot=None):
+        snapshot = self._snapshot(snapshot, 'overview', id)
+        cancel_link = snapshot.cancel_link(what_queue)
+        if cancel_link is None:
             return
+        cancel_token, type, listid = cancel_link
         self.session.get(
             url=self.index_php,
             params={'page': 'ingame',
@@ -1569,9 +1811,11 @@ class OGame(object):
                     'modus': 2,
                     'token': cancel_token,
                     'action': 'cancel',
-                    'type': parameters.group(1),
-                    'listid': parameters.group(2)}
+                    'type': type,
+                    'listid': listid,
+                    'cp': id}
         )
+        self._invalidate('cancel', id)
 
     def collect_rubble_field(self, id):
         self.session.get(
@@ -1580,6 +1824,7 @@ class OGame(object):
                 '&action=startRepairs&asJson=1&cp={}'
                 .format(id),
             headers={'X-Requested-With': 'XMLHttpRequest'})
+        self._invalidate('collect_rubble_field', id)
 
     def is_logged_in(self):
         response = self.session.get(
@@ -1605,18 +1850,28 @@ class OGame(object):
             return False
 
     def relogin(self, universe=None):
-        if universe is None:
-            universe = self.universe
-        OGame.__init__(self, universe, self.username, self.password,
-                       self.user_agent, self.proxy)
+        if universe is not None and universe != self.universe:
+            self.universe = universe
+            self.server_number = None
+        # the session and its pooled connections are kept, only the login
+        # chain runs again; a stale token falls back to a password login
+        if self.cache is not None:
+            self.cache.clear()
+        self.event_box_snapshot = None
+        self.production_figures.clear()
+        self.research_state = None
+        self._login()
         return OGame.is_logged_in(self)
 
     def keep_going(self, function):
         try:
-            function()
-        except:
+            return function()
+        except SessionExpired:
+            # the session was already renewed, only the action is repeated
+            return function()
+        except Exception:
             self.relogin()
-            function()
+            return function()
 
     def logout(self):
         self.session.get(self.index_php + 'page=logout')
@@ -1643,7 +1898,7 @@ class OGame(object):
 
         time.sleep(random.randint(250, 1500) / 1000)
 
-        bs4 = BeautifulSoup4(response2)
+        bs4 = BeautifulSoup4(response2, self.parser)
 
         try:
             item_available = bs4.find_partial(class_='bargain import_bargain take hidden').text
@@ -1719,6 +1974,7 @@ class OGame(object):
                 'page=ajax&component=traderimportexport&ajax=1&action=trade&asJson=1',
             data=form_data,
             headers={'X-Requested-With': 'XMLHttpRequest'}).json()
+        self._invalidate('buy_offer_of_the_day')
 
         try:
             new_token = response3['newAjaxToken']
@@ -1745,7 +2001,286 @@ class OGame(object):
         return getitem
 
 
+class AsyncOGame(object):
+    def __init__(self, empire, connections=100):
+        try:
+            import aiohttp
+        except ImportError:
+            raise ImportError(
+                'AsyncOGame requires aiohttp, install it with pip install ogame[async]'
+            )
+        self.aiohttp = aiohttp
+        self.empire = empire
+        self.index_php = empire.index_php
+        self.connections = connections
+        self.session = None
+        self.event_box_lock = None
+
+    def _client(self):
+        # aiohttp sessions belong to the running loop, so create on first use
+        if self.session is None:
+            import yarl
+            aiohttp = self.aiohttp
+            timeout = self.empire.session.timeout
+            if isinstance(timeout, tuple):
+                timeout = aiohttp.ClientTimeout(
+                    sock_connect=timeout[0], sock_read=timeout[1]
+                )
+            else:
+                timeout = aiohttp.ClientTimeout(total=timeout)
+            jar = aiohttp.CookieJar()
+            for cookie in self.empire.session.cookies:
+                morsel = SimpleCookie({cookie.name: cookie.value})
+                morsel[cookie.name]['domain'] = cookie.domain
+                morsel[cookie.name]['path'] = cookie.path
+                jar.update_cookies(morsel, response_url=yarl.URL(self.index_php))
+            headers = {
+                key: value for key, value in self.empire.session.headers.items()
+                if key not in ('Accept-Encoding', 'Connection', 'Content-Type')
+            }
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections),
+                cookie_jar=jar,
+                headers=headers,
+                timeout=timeout
+            )
+            self.event_box_lock = asyncio.Lock()
+        return self.session
+
+    async def _request(self, method, url, json=False, **kwargs):
+        async with self._client().request(method, url, **kwargs) as response:
+            if json:
+                return await response.json(content_type=None)
+            return await response.text()
+
+    async def _page(self, component, id=None, page='ingame'):
+        cache = self.empire.cache
+        key = (component or page, id)
+        if cache is not None:
+            response = cache.get(key)
+            if response is not None:
+                return response
+        url = self.index_php + 'page={}'.format(page)
+        if component is not None:
+            url += '&component={}'.format(component)
+        if id is not None:
+            url += '&cp={}'.format(id)
+        response = await self._request('GET', url)
+        if cache is not None:
+            cache.put(key, response)
+        return response
+
+    async def _deadline(self, awaitable, deadline):
+        if deadline is None:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, deadline)
+        except asyncio.TimeoutError as e:
+            raise DeadlineExceeded(f'Deadline of {deadline}s exceeded') from e
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def event_box(self, refresh=False):
+        self._client()
+        async with self.event_box_lock:
+            empire = self.empire
+            snapshot = empire.event_box_snapshot
+            if refresh or snapshot is None \
+                    or snapshot.age() > empire.event_box_ttl:
+                response = await self._request(
+                    'GET',
+                    self.index_php + 'page=componentOnly'
+                                     '&component=eventList&action=fetchEventBox&ajax=1&asJson=1',
+                    json=True,
+                    headers={'X-Requested-With': 'XMLHttpRequest'}
+                )
+                snapshot = empire.event_box_snapshot = EventBox(response)
+        return snapshot
+
+    async def galaxy(self, coords):
+        response = await self._request(
+            'POST',
+            self.index_php + 'page=ingame&component=galaxyContent&ajax=1',
+            json=True,
+            data={'galaxy': coords[0], 'system': coords[1]},
+            headers={'X-Requested-With': 'XMLHttpRequest'}
+        )
+        return self.empire._galaxy(response['galaxy'], coords)
+
+    async def spyreports(self, firstpage=1, lastpage=30):
+        pages = await asyncio.gather(*[
+            self._request('GET', self.index_php, params={
+                'page': 'messages',
+                'tab': 20,
+                'action': 107,
+                'messageId': -1,
+                'pagination': pagination,
+                'ajax': 1
+            })
+            for pagination in range(firstpage, lastpage + 1)
+        ], return_exceptions=True)
+        report_links = []
+        for response in pages:
+            if isinstance(response, Exception):
+                print(response)
+                break
+            for link in self.empire._report_links(response):
+                if link not in report_links:
+                    report_links.append(link)
+        responses = await asyncio.gather(*[
+            self._request('GET', link) for link in report_links
+        ])
+        reports = [self.empire._spyreport(response) for response in responses]
+        return [report for report in reports if report is not None]
+
+    async def resources(self, id):
+        response = await self._page(None, id, page='resourceSettings')
+        return self.empire._resources(response)
+
+    async def _technologies(self, record, spec, component, id):
+        response = await self._page(component, id)
+        return technologies_record(
+            record, page_specs[spec].extract(response, self.empire.parser)
+        )
+
+    async def supply(self, id):
+        return await self._technologies(Supplies, 'supplies', 'supplies', id)
+
+    async def facilities(self, id):
+        return await self._technologies(Facilities, 'facilities', 'facilities', id)
+
+    async def moon_facilities(self, id):
+        return await self._technologies(
+            MoonFacilities, 'moon_facilities', 'facilities', id
+        )
+
+    async def research(self, id=None):
+        if id is None:
+            id = self.empire.planet_ids()[0]
+        return await self._technologies(Researches, 'research', 'research', id)
+
+    async def ships(self, id):
+        return await self._technologies(Ships, 'shipyard', 'shipyard', id)
+
+    async def defences(self, id):
+        return await self._technologies(Defences, 'defenses', 'defenses', id)
+
+    async def slot_fleet(self):
+        response = await self._page('fleetdispatch')
+        return self.empire._slot_fleet(response)
+
+    async def fleet(self, refresh=False):
+        box = await self.event_box(refresh)
+        hostile, friendly = await asyncio.gather(
+            self.hostile_fleet(box), self.friendly_fleet(box)
+        )
+        return hostile + friendly
+
+    async def friendly_fleet(self, box=None):
+        if box is None:
+            box = await self.event_box()
+        if not box.friendly:
+            return []
+        response = await self._page('movement')
+        return self.empire._friendly_fleet(response)
+
+    async def hostile_fleet(self, box=None):
+        if box is None:
+            box = await self.event_box()
+        if not box.hostile:
+            return []
+        response = await self._request(
+            'GET', self.index_php + 'page=componentOnly&component=eventList'
+        )
+        return self.empire._hostile_fleet(response)
+
+    async def send_fleet(
+            self,
+            mission,
+            id,
+            where,
+            ships,
+            resources=(0, 0, 0), speed=10, holdingtime=0, deadline=None
+    ):
+        async def send():
+            response = await self._page('fleetdispatch', id)
+            form_data = fleet_form(
+                response, mission, where, ships, resources, speed, holdingtime
+            )
+            # cp pins the planet, other requests in flight move the current one
+            response = await self._request(
+                'POST',
+                self.index_php + 'page=ingame&component=fleetdispatch'
+                                 '&action=sendFleet&ajax=1&asJson=1&cp={}'
+                .format(id),
+                json=True,
+                data=form_data,
+                headers={'X-Requested-With': 'XMLHttpRequest'}
+            )
+            self.empire._invalidate('send_fleet', id)
+            return response['success']
+        return await self._deadline(send(), deadline)
+
+    async def return_fleet(self, fleet_id, deadline=None):
+        async def recall():
+            response = await self._page('movement')
+            token = return_token(response, fleet_id)
+            if token is None:
+                return False
+            await self._request(
+                'GET',
+                self.index_php + 'page=ingame&component=movement&return={}&token={}'
+                .format(fleet_id, token)
+            )
+            self.empire._invalidate('return_fleet')
+            return True
+        return await self._deadline(recall(), deadline)
+
+    async def build(self, what, planet_id, deadline=None):
+        async def schedule():
+            type, amount, component = what[0], what[1], what[2]
+            snapshot = PageSnapshot(
+                component, planet_id,
+                await self._page(component, planet_id), self.empire.parser
+            )
+            await self._request(
+                'POST',
+                self.index_php +
+                'page=componentOnly&component=buildlistactions&action=scheduleEntry&asJson=1'
+                '&cp={}'.format(planet_id),
+                data={
+                    'technologyId': type,
+                    'amount': amount,
+                    'mode': 1,
+                    'token': snapshot.token
+                },
+                headers={'X-Requested-With': 'XMLHttpRequest'}
+            )
+            self.empire._invalidate('build', planet_id, component)
+        return await self._deadline(schedule(), deadline)
+
+
 def solve_captcha(question_raw, icons_raw):
+    try:
+        import cv2
+        import imagehash
+        from PIL import Image
+        from pytesseract import image_to_string
+    except ImportError as e:
+        raise ImportError(
+            'solving the login captcha needs the captcha extra, '
+            'install it with pip install ogame[captcha]'
+        ) from e
+
     hash_values = {
         "cc6c3193cec65c39": "star",
         "ccc6713993e664cc": "bulb",
@@ -1971,8 +2506,82 @@ def get_blackbox():
     return encrypt(en_obj)
 
 
-def BeautifulSoup4(response):
-    parsed = BeautifulSoup(response, features="html5lib")
+# Parser backends in order of preference. html.parser ships with python and
+# honours parse_only, html5lib is the slow but lenient last resort
+parsers = ('lxml', 'html.parser', 'html5lib')
+
+
+def parser_backend(parser=None):
+    if parser is not None:
+        if builder_registry.lookup(parser) is None:
+            raise ValueError(
+                f'HTML parser backend {parser} is not installed, use one of {parsers}'
+            )
+        return parser
+    for backend in parsers:
+        if builder_registry.lookup(backend) is not None:
+            return backend
+    raise ValueError('No HTML parser backend installed')
+
+
+def benchmark_parsers(pages, backends=parsers, number=10):
+    timings = {}
+    for name, page in pages.items():
+        timings[name] = {}
+        for backend in backends:
+            if builder_registry.lookup(backend) is None:
+                continue
+            start = time.perf_counter()
+            for _ in range(number):
+                BeautifulSoup4(page, backend)
+            timings[name][backend] = (time.perf_counter() - start) / number
+    return timings
+
+
+# None of these may be loaded by a plain import ogame
+deferred_modules = (
+    'cv2', 'PIL', 'imagehash', 'pytesseract', 'numpy', 'scipy', 'pywt',
+    'unittest', 'aiohttp'
+)
+
+
+def benchmark_import(number=5):
+    import statistics
+    import subprocess
+    import sys
+    script = (
+        'import sys, time\n'
+        'start = time.perf_counter()\n'
+        'import ogame\n'
+        'print(time.perf_counter() - start)\n'
+        f'print(",".join(m for m in {deferred_modules!r} if m in sys.modules))\n'
+    )
+    environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        os.environ.get('PYTHONPATH')
+    ])))
+    timings = []
+    loaded = set()
+    for _ in range(number):
+        # a fresh interpreter each time, sys.modules of this one is warm
+        output = subprocess.run(
+            [sys.executable, '-c', script],
+            capture_output=True, text=True, check=True, env=environment
+        ).stdout.splitlines()
+        timings.append(float(output[0]))
+        loaded.update(filter(None, output[1].split(',')))
+    return {'seconds': statistics.median(timings), 'loaded': sorted(loaded)}
+
+
+# Component pages only need the technology list, html5lib ignores parse_only
+technologies_only = SoupStrainer('li', attrs={'data-technology': True})
+resource_bar_only = SoupStrainer('span', id=re.compile('^resources_'))
+
+
+def BeautifulSoup4(response, parser='html5lib', parse_only=None):
+    if parser == 'html5lib':
+        parse_only = None
+    parsed = BeautifulSoup(response, features=parser, parse_only=parse_only)
 
     def find_partial(**kwargs):
         for key, value in kwargs.items():
@@ -1987,3 +2596,955 @@ def BeautifulSoup4(response):
     parsed.find_partial = find_partial
     parsed.find_all_partial = find_all_partial
     return parsed
+
+
+# Extraction
+def to_int(string):
+    return int(float(string.replace('M', '000').replace('n', '')))
+
+
+def dotted_int(string):
+    return int(string.replace('.', ''))
+
+
+class Field(object):
+    __slots__ = ('name', 'selector', 'regex', 'attr', 'convert', 'many')
+
+    def __init__(
+            self, name, selector=None, regex=None,
+            attr=None, convert=None, many=False
+    ):
+        self.name = name
+        self.selector = soupsieve.compile(selector) if selector else None
+        self.regex = re.compile(regex) if regex else None
+        self.attr = attr
+        self.convert = convert
+        self.many = many
+
+    def extract(self, response, bs4):
+        if self.selector is None:
+            matches = self.regex.finditer(response) if self.many \
+                else [self.regex.search(response)]
+            if self.regex.groups > 1:
+                values = [match.groups() for match in matches if match]
+            else:
+                values = [match.group(self.regex.groups) for match in matches if match]
+        else:
+            tags = self.selector.select(bs4) if self.many \
+                else [self.selector.select_one(bs4)]
+            values = [
+                tag.get(self.attr) if self.attr else tag.text
+                for tag in tags if tag is not None
+            ]
+        if self.convert is not None:
+            values = [self.convert(value) for value in values]
+        if self.many:
+            return values
+        return values[0] if values else None
+
+
+class Page(object):
+    __slots__ = ('fields', 'technologies', 'parse_only', 'soup')
+
+    def __init__(self, fields=(), technologies=None, parse_only=None):
+        self.fields = tuple(fields)
+        self.technologies = technologies
+        self.parse_only = parse_only
+        self.soup = technologies is not None or any(
+            field.selector is not None for field in self.fields
+        )
+
+    def extract(self, response, parser):
+        bs4 = BeautifulSoup4(response, parser, self.parse_only) \
+            if self.soup else None
+        values = {
+            field.name: field.extract(response, bs4)
+            for field in self.fields
+        }
+        if self.technologies is not None:
+            found = technologies(bs4)
+            for name, technology_id in self.technologies.items():
+                values[name] = found.get(technology_id, (0, 'off'))
+        return values
+
+
+def technologies(bs4):
+    found = {}
+    for technology in bs4.find_all('li', attrs={'data-technology': True}):
+        value = technology.find(
+            class_=['level', 'amount'], attrs={'data-value': True}
+        ) or technology.find(attrs={'data-value': True})
+        found[int(technology['data-technology'])] = (
+            int(value['data-value']) if value else 0,
+            technology.get('data-status')
+        )
+    return found
+
+
+def technology_ids(constants, *names):
+    ids = {}
+    for name in names:
+        technology = getattr(constants, name)
+        if callable(technology):
+            technology = technology()
+        ids[name] = technology[0]
+    return ids
+
+
+def end_time(timestamp):
+    return datetime.fromtimestamp(int(timestamp)) if timestamp else None
+
+
+def temperature(text):
+    return re.findall(r'\d+(?: \d+)?', text.replace('\\u00b0', ''))[:2]
+
+
+def celestial_fields(groups):
+    return int(groups[0].replace('.', '')), int(groups[1]), int(groups[3])
+
+
+class PageSnapshot(object):
+    __slots__ = (
+        'component', 'id', 'response', 'parser', 'spec', 'fetched', '_token',
+        '_levels'
+    )
+
+    def __init__(self, component, id, response, parser, spec=None):
+        self.component = component
+        self.id = id
+        self.response = response
+        self.parser = parser
+        self.spec = spec or component
+        self.fetched = time.monotonic()
+        token = re.search(r'var token\s?=\s?"([^"]*)";', response)
+        self._token = token.group(1) if token else None
+        self._levels = None
+
+    def age(self):
+        return time.monotonic() - self.fetched
+
+    @property
+    def levels(self):
+        # parsed on first use, a snapshot taken only for a token skips it
+        if self._levels is None and self.spec in snapshot_records:
+            self._levels = technologies_record(
+                snapshot_records[self.spec],
+                page_specs[self.spec].extract(self.response, self.parser)
+            )
+        return self._levels
+
+    @property
+    def token(self):
+        if self._token is None:
+            raise ValueError(
+                f'No build token on the {self.component} page of {self.id}'
+            )
+        return self._token
+
+    @property
+    def downgrade_token(self):
+        token = re.search(
+            r"var downgradeEndpoint = (.*)token=(.*)\&", self.response
+        )
+        if token is None:
+            raise ValueError(
+                f'No downgrade token on the {self.component} page of {self.id}'
+            )
+        return token.group(2)
+
+    def cancel_link(self, what_queue):
+        token = re.search(
+            rf"var cancelLink{what_queue} = (.*)token=(.*)\&", self.response
+        )
+        parameters = re.search(
+            rf"\"cancel{what_queue}\((.*)\, (.*)\,", self.response
+        )
+        if token is None or parameters is None:
+            return None
+        return token.group(2), parameters.group(1), parameters.group(2)
+
+    def renew_token(self, response):
+        # ajax actions may hand back the token for the next one, without it
+        # the token is spent and the page has to be downloaded again
+        try:
+            token = response.json().get('newAjaxToken')
+        except (ValueError, AttributeError):
+            return False
+        if not token:
+            return False
+        self._token = token
+        return True
+
+
+class EventBox(object):
+    __slots__ = ('hostile', 'neutral', 'friendly', 'fetched')
+
+    def __init__(self, response):
+        self.hostile = response['hostile']
+        self.neutral = response['neutral']
+        self.friendly = response['friendly']
+        self.fetched = time.monotonic()
+
+    def age(self):
+        return time.monotonic() - self.fetched
+
+
+# Cached views changed by each action, 'component' is the component acted on.
+# Views in account_views are evicted for every celestial, the rest only for
+# the celestial the action ran on. 'resource_bar' evicts every page in
+# resource_bar_pages, their resource bar is read by resources().
+invalidates = {
+    'build': ('component', 'resource_bar', 'production'),
+    'deconstruct': ('component', 'resource_bar', 'production'),
+    'cancel': (
+        'supplies', 'facilities', 'research', 'shipyard', 'defenses',
+        'resource_bar', 'production'
+    ),
+    'send_fleet': ('resource_bar', 'fleetdispatch', 'movement', 'eventbox'),
+    'return_fleet': ('fleetdispatch', 'movement', 'eventbox'),
+    'resources_settings': ('resource_bar', 'production'),
+    'collect_rubble_field': ('shipyard', 'defenses', 'overview'),
+    'buy_offer_of_the_day': ('resource_bar',),
+}
+account_views = ('research', 'fleetdispatch', 'movement')
+
+
+# Reads that take a celestial id and can run concurrently in gather
+gatherable = (
+    'resources', 'supply', 'facilities', 'moon_facilities', 'research',
+    'ships', 'defences', 'celestial', 'celestial_queue'
+)
+
+
+class ResponseCache(object):
+    ttls = {
+        'overview': 5,
+        'fleetdispatch': 5,
+        'movement': 5,
+        'supplies': 30,
+        'facilities': 30,
+        'research': 30,
+        'shipyard': 30,
+        'defenses': 30,
+        'resourceSettings': 10,
+        'resourcesettings': 60,
+    }
+
+    def __init__(self, ttl=None, maxsize=256, default_ttl=10):
+        self.ttl = dict(ResponseCache.ttls, **(ttl or {}))
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, response):
+        expires = time.monotonic() + self.ttl.get(key[0], self.default_ttl)
+        with self.lock:
+            self.entries[key] = (expires, response)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def latest(self, id, components):
+        # the most recently fetched live page of one celestial
+        now = time.monotonic()
+        latest = None
+        with self.lock:
+            for component in components:
+                entry = self.entries.get((component, id))
+                if entry is None or entry[0] <= now:
+                    continue
+                fetched = entry[0] - self.ttl.get(component, self.default_ttl)
+                if latest is None or fetched > latest[0]:
+                    latest = (fetched, entry[1])
+        return latest[1] if latest is not None else None
+
+    def invalidate(self, component, id=None):
+        with self.lock:
+            for key in list(self.entries):
+                if key[0] == component and (id is None or key[1] == id):
+                    del self.entries[key]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self.entries),
+                'maxsize': self.maxsize
+            }
+
+
+class Flight(object):
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    def __init__(self, remaining=None):
+        # remaining() gives the seconds left to the caller's deadline or None,
+        # a follower stops waiting then while the leader's request goes on
+        self.remaining = remaining
+        self.lock = threading.Lock()
+        self.flights = {}
+        self.calls = 0
+        self.shared = 0
+
+    def do(self, key, function):
+        with self.lock:
+            self.calls += 1
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+            else:
+                self.shared += 1
+        if not leader:
+            timeout = self.remaining() if self.remaining is not None else None
+            if not flight.done.wait(None if timeout is None else max(timeout, 0)):
+                raise DeadlineExceeded(f'Deadline exceeded waiting for {key}')
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = function()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        with self.lock:
+            return {
+                'calls': self.calls,
+                'shared': self.shared,
+                'in_flight': len(self.flights)
+            }
+
+
+class ServerIndex(object):
+    def __init__(self, universes, fetched=None):
+        self.universes = universes
+        self.fetched = fetched or time.time()
+
+    @classmethod
+    def build(cls, servers):
+        universes = {}
+        for server in servers:
+            universes.setdefault(server['name'], []).append(
+                (server['number'], server['language'])
+            )
+        return cls(universes)
+
+    def age(self):
+        return time.time() - self.fetched
+
+    def find(self, universe, language=None):
+        servers = self.universes.get(universe)
+        if not servers:
+            return None
+        for number, server_language in servers:
+            if server_language == language:
+                return number, server_language
+        return tuple(servers[0])
+
+
+server_indexes = {}
+server_indexes_lock = threading.Lock()
+
+
+def server_index(session, url, cache_file=None, ttl=3600, refresh=False):
+    with server_indexes_lock:
+        index = server_indexes.get(url)
+        if not refresh and index is None and cache_file is not None:
+            try:
+                with open(cache_file) as f:
+                    cached = json.load(f).get(url)
+                if cached is not None:
+                    index = ServerIndex(cached['universes'], cached['fetched'])
+            except (OSError, ValueError):
+                pass
+        if refresh or index is None or index.age() > ttl:
+            index = ServerIndex.build(session.get(url).json())
+            if cache_file is not None:
+                try:
+                    with open(cache_file) as f:
+                        cached = json.load(f)
+                except (OSError, ValueError):
+                    cached = {}
+                cached[url] = {
+                    'fetched': index.fetched, 'universes': index.universes
+                }
+                try:
+                    write_json(cache_file, cached)
+                except OSError:
+                    pass
+        server_indexes[url] = index
+        return index
+
+
+def write_json(path, data):
+    # a temporary file of its own per writer, so processes sharing the path
+    # never replace each other's half written file
+    descriptor, temporary = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)),
+        prefix=os.path.basename(path) + '.', suffix='.tmp'
+    )
+    try:
+        with os.fdopen(descriptor, 'w') as f:
+            json.dump(data, f)
+        os.replace(temporary, path)
+    except BaseException:
+        try:
+            os.remove(temporary)
+        except OSError:
+            pass
+        raise
+
+
+def meta(bs4, name):
+    tag = bs4.find('meta', {'name': name})
+    return tag['content'] if tag else None
+
+
+def celestial_coordinates(title, destination):
+    coordinates = re.search(r'\[(.*)]', title).group(1)
+    coordinates = [int(coords) for coords in coordinates.split(':')]
+    coordinates.append(destination)
+    return tuple(coordinates)
+
+
+class LandingState(object):
+    __slots__ = (
+        'player', 'player_id', 'version', 'universe_speed', 'fleet_speed',
+        'donut_galaxy', 'donut_system', 'character_class', 'rank',
+        'alliance', 'officers', 'slots', 'planet_ids', 'moon_ids', 'moons',
+        'names', 'planet_by_name', 'coordinates'
+    )
+
+    def __init__(self, bs4):
+        self.player = meta(bs4, 'ogame-player-name')
+        self.player_id = int(meta(bs4, 'ogame-player-id'))
+        self.version = meta(bs4, 'ogame-version')
+        self.universe_speed = int(meta(bs4, 'ogame-universe-speed') or 0)
+        self.fleet_speed = int(
+            meta(bs4, 'ogame-universe-speed-fleet-peaceful') or 0
+        )
+        self.donut_galaxy = meta(bs4, 'ogame-donut-galaxy') == '1'
+        self.donut_system = meta(bs4, 'ogame-donut-system') == '1'
+        self.alliance = meta(bs4, 'ogame-alliance-name')
+
+        character = bs4.find_partial(class_='sprite characterclass medium')
+        self.character_class = character['class'][3] if character else None
+
+        self.rank = None
+        bar = bs4.find(id='bar')
+        if bar is not None and len(bar.find_all('li')) > 1:
+            rank = re.search(r'\((.*)\)', bar.find_all('li')[1].text)
+            if rank is not None:
+                self.rank = int(rank.group(1))
+
+        self.officers = {
+            officer: bs4.find_partial(class_='on ' + officer) is not None
+            for officer in (
+                'commander', 'admiral', 'engineer', 'geologist', 'technocrat'
+            )
+        }
+
+        slots = bs4.find('p', attrs={'class': 'textCenter'})
+        slots = slots.find('span').text.split('/') if slots else (0, 0)
+        self.slots = tuple(int(slot) for slot in slots)
+
+        planet_ids, moon_ids = [], []
+        self.names, self.planet_by_name, self.coordinates = {}, {}, {}
+        for celestial in bs4.find_all(class_='smallplanet'):
+            id = int(celestial['id'].replace('planet-', ''))
+            planet_ids.append(id)
+            name = celestial.find(class_='planet-name')
+            self.names[id] = name.text if name else None
+            self.planet_by_name.setdefault(self.names[id], id)
+            planet = celestial.find(class_='planetlink')
+            if planet is not None:
+                self.coordinates[id] = celestial_coordinates(
+                    planet['title'], const.destination.planet
+                )
+            moon = celestial.find(class_='moonlink')
+            if moon is None:
+                continue
+            id = int(re.search('cp=(.*)', moon['href']).group(1))
+            moon_ids.append(id)
+            self.names[id] = re.search(r'<b>(.*) \[', moon['title']).group(1)
+            self.coordinates[id] = celestial_coordinates(
+                moon['title'], const.destination.moon
+            )
+        self.planet_ids = tuple(planet_ids)
+        self.moon_ids = tuple(moon_ids)
+        self.moons = frozenset(moon_ids)
+
+
+# Selectors and regexes are compiled once at import, keyed by component
+resource_bar = [
+    Field('metal', '#resources_metal', attr='data-raw', convert=to_int),
+    Field('crystal', '#resources_crystal', attr='data-raw', convert=to_int),
+    Field('deuterium', '#resources_deuterium', attr='data-raw', convert=to_int),
+    Field('darkmatter', '#resources_darkmatter', attr='data-raw', convert=to_int),
+    Field('energy', '#resources_energy', attr='data-raw', convert=to_int),
+]
+
+# Cached pages of a celestial whose resource bar can stand in for fetchResources
+resource_bar_pages = (
+    'supplies', 'facilities', 'research', 'shipyard', 'defenses',
+    'overview', 'fleetdispatch', 'resourceSettings', 'resourcesettings'
+)
+
+
+def fetched_resources(response):
+    # fetchResources answers {name: {amount}} or the older
+    # {name: {resources: {actual}}}, with or without a resources wrapper
+    response = response.get('resources', response)
+    values = {}
+    for name in ('metal', 'crystal', 'deuterium', 'darkmatter', 'energy'):
+        entry = response.get(name) or {}
+        amount = entry.get('amount')
+        if amount is None:
+            amount = (entry.get('resources') or {}).get('actual')
+        values[name] = int(float(amount)) if amount is not None else None
+    return values
+
+
+page_specs = {
+    'supplies': Page(
+        technologies=technology_ids(
+            const.buildings, 'metal_mine', 'crystal_mine', 'deuterium_mine',
+            'solar_plant', 'fusion_plant', 'metal_storage',
+            'crystal_storage', 'deuterium_storage'
+        ),
+        parse_only=technologies_only
+    ),
+    'facilities': Page(
+        technologies=technology_ids(
+            const.buildings, 'robotics_factory', 'shipyard',
+            'research_laboratory', 'alliance_depot', 'missile_silo',
+            'nanite_factory', 'terraformer', 'repair_dock'
+        ),
+        parse_only=technologies_only
+    ),
+    'moon_facilities': Page(
+        technologies=technology_ids(
+            const.buildings, 'robotics_factory', 'shipyard', 'moon_base',
+            'sensor_phalanx', 'jump_gate'
+        ),
+        parse_only=technologies_only
+    ),
+    'research': Page(
+        technologies=technology_ids(
+            const.research, 'energy', 'laser', 'ion', 'hyperspace', 'plasma',
+            'combustion_drive', 'impulse_drive', 'hyperspace_drive',
+            'espionage', 'computer', 'astrophysics', 'research_network',
+            'graviton', 'weapons', 'shielding', 'armor'
+        ),
+        fields=[
+            Field('end', 'li[data-status="active"]', attr='data-end',
+                  convert=end_time),
+        ],
+        parse_only=technologies_only
+    ),
+    'shipyard': Page(
+        technologies=dict(
+            technology_ids(
+                const.ships, 'light_fighter', 'heavy_fighter', 'cruiser',
+                'battleship', 'interceptor', 'bomber', 'destroyer',
+                'deathstar', 'reaper', 'explorer', 'small_transporter',
+                'large_transporter', 'colonyShip', 'recycler',
+                'espionage_probe', 'crawler'
+            ),
+            solarSatellite=const.buildings.solar_satellite()[0]
+        ),
+        parse_only=technologies_only
+    ),
+    'defenses': Page(
+        technologies=technology_ids(
+            const.buildings, 'rocket_launcher', 'laser_cannon_light',
+            'laser_cannon_heavy', 'gauss_cannon', 'ion_cannon',
+            'plasma_cannon', 'shield_dome_small', 'shield_dome_large',
+            'missile_interceptor', 'missile_interplanetary'
+        ),
+        parse_only=technologies_only
+    ),
+    'resourceBar': Page(fields=resource_bar, parse_only=resource_bar_only),
+    'resourceSettings': Page(fields=[
+        *resource_bar,
+        Field('day_production', 'tr.summary td.undermark > span',
+              attr='title', convert=dotted_int, many=True),
+        Field('storage', 'td.left2 > span',
+              attr='title', convert=dotted_int, many=True),
+    ]),
+    'overview': Page(fields=[
+        Field('fields', regex=r'textContent\[1] = "(.*)km \(<span>(.*)<(.*)<span>(.*)<',
+              convert=celestial_fields),
+        Field('temperature', regex=r'textContent\[3] = "(.*)"',
+              convert=temperature),
+    ]),
+    'fleetdispatch': Page(fields=[
+        Field('slots', 'div#slots.fleft .fleft', many=True),
+    ]),
+}
+fleet_slots = re.compile(':(.*)/(.*)')
+expedition_slots = re.compile(' (.*)/(.*)\\n')
+
+
+def fleet_form(response, mission, where, ships, resources, speed, holdingtime):
+    send_fleet_token = re.search('var fleetSendingToken = "(.*)"', response)
+    if send_fleet_token is None:
+        send_fleet_token = re.search('var token = "(.*)"', response)
+    form_data = {'token': send_fleet_token.group(1)}
+    for ship in ships:
+        ship_type = 'am{}'.format(ship[0])
+        form_data.update({ship_type: ship[1]})
+    form_data.update(
+        {
+            'galaxy': where[0],
+            'system': where[1],
+            'position': where[2],
+            'type': where[3],
+            'metal': resources[0],
+            'crystal': resources[1],
+            'deuterium': resources[2],
+            'prioMetal': 1,
+            'prioCrystal': 2,
+            'prioDeuterium': 3,
+            'mission': mission,
+            'speed': speed,
+            'retreatAfterDefenderRetreat': 0,
+            'union': 0,
+            'holdingtime': holdingtime
+        }
+    )
+    return form_data
+
+
+def return_token(response, fleet_id):
+    if "return={}".format(fleet_id) not in response:
+        return None
+    return re.search(
+        'return={}'.format(fleet_id) + '&amp;token=(.*)" ', response
+    ).group(1).split('"')[0]
+
+
+def schedule_result(response):
+    try:
+        answer = response.json()
+    except ValueError:
+        return response.ok, None if response.ok else response.reason
+    status = answer.get('status') if isinstance(answer, dict) else None
+    if status is None or status == 'success':
+        return response.ok, None if response.ok else response.reason
+    errors = answer.get('errors') or []
+    message = '; '.join(
+        error.get('message', '') for error in errors if isinstance(error, dict)
+    )
+    return False, message or answer.get('message') or status
+
+
+# Records
+class Record(object):
+    __slots__ = ()
+    converters = ()
+
+    @property
+    def list(self):
+        return [*self]
+
+    def to_dict(self):
+        return {
+            field: value.to_dict() if isinstance(value, Record) else value
+            for field, value in zip(self._fields, self)
+        }
+
+    @classmethod
+    def load(cls, values):
+        if isinstance(values, dict):
+            values = [values[field] for field in cls._fields]
+        if cls.converters:
+            values = list(values)
+            for index, convert in cls.converters:
+                if values[index] is not None:
+                    values[index] = convert(values[index])
+        return cls._make(values)
+
+
+record_types = {}
+
+
+def record(name, fields, types=None):
+    base = namedtuple(name, fields)
+    converters = tuple(
+        (base._fields.index(field), convert)
+        for field, convert in (types or {}).items()
+    )
+    record_types[name] = type(
+        name, (base, Record), {'__slots__': (), 'converters': converters}
+    )
+    return record_types[name]
+
+
+class TechState(namedtuple('TechState', 'level is_possible in_construction'), Record):
+    __slots__ = ()
+
+    @property
+    def amount(self):
+        return self.level
+
+
+record_types['TechState'] = TechState
+
+
+def technologies_record(record, values):
+    states = []
+    for name in record._fields:
+        level, status = values[name]
+        states.append(TechState(
+            level, OGame.isPossible(status), OGame.inConstruction(status)
+        ))
+    return record(*states)
+
+
+def technologies_type(name, spec):
+    return record(name, spec.technologies, dict.fromkeys(
+        spec.technologies, TechState.load
+    ))
+
+
+Supplies = technologies_type('Supplies', page_specs['supplies'])
+Facilities = technologies_type('Facilities', page_specs['facilities'])
+MoonFacilities = technologies_type('MoonFacilities', page_specs['moon_facilities'])
+Researches = technologies_type('Researches', page_specs['research'])
+Ships = technologies_type('Ships', page_specs['shipyard'])
+Defences = technologies_type('Defences', page_specs['defenses'])
+Resources = record('Resources', (
+    'resources', 'metal', 'crystal', 'deuterium',
+    'day_production', 'storage', 'darkmatter', 'energy'
+))
+Settings = record('Settings', (
+    'metal_mine', 'crystal_mine', 'deuterium_mine', 'solar_plant',
+    'fusion_plant', 'solar_satellite', 'crawler'
+))
+Celestial = record('Celestial', (
+    'diameter', 'used', 'total', 'free', 'temperature', 'coordinates'
+))
+Queue = record('Queue', ('research', 'buildings', 'shipyard'), {
+    'research': datetime.fromtimestamp,
+    'buildings': datetime.fromtimestamp,
+    'shipyard': datetime.fromtimestamp
+})
+Slots = record('Slots', ('total', 'free'))
+FleetSlots = record('FleetSlots', ('fleet', 'expedition'), {
+    'fleet': Slots.load,
+    'expedition': Slots.load
+})
+Speed = record('Speed', ('universe', 'fleet'))
+Donut = record('Donut', ('galaxy', 'system'))
+Server = record('Server', ('version', 'Speed', 'Donut'), {
+    'Speed': Speed.load,
+    'Donut': Donut.load
+})
+Officers = record('Officers', (
+    'commander', 'admiral', 'engineer', 'geologist', 'technocrat'
+))
+Position = record('Position', (
+    'name', 'position', 'player', 'player_id',
+    'rank', 'status', 'moon', 'alliance'
+))
+Debris = record('Debris', (
+    'position', 'has_debris', 'resources', 'metal', 'crystal', 'deuterium'
+))
+Fleet = record('Fleet', (
+    'id', 'mission', 'diplomacy', 'player_name', 'player_id',
+    'returns', 'arrival', 'origin', 'destination'
+), {'arrival': datetime.fromtimestamp})
+Report = record('Report', (
+    'name', 'position', 'moon', 'datetime', 'metal', 'crystal', 'deuterium',
+    'resources', 'fleet', 'defenses', 'buildings', 'research', 'api'
+))
+BuildResult = record('BuildResult', ('what', 'planet_id', 'success', 'error'))
+snapshot_records = {
+    'supplies': Supplies,
+    'facilities': Facilities,
+    'moon_facilities': MoonFacilities,
+    'research': Researches,
+    'shipyard': Ships,
+    'defenses': Defences,
+}
+EmpirePlanet = record('EmpirePlanet', (
+    'id', 'name', 'celestial', 'resources',
+    'supply', 'facilities', 'ships', 'defences'
+), {
+    'celestial': Celestial.load,
+    'resources': Resources.load,
+    'supply': Supplies.load,
+    'facilities': Facilities.load,
+    'ships': Ships.load,
+    'defences': Defences.load
+})
+EmpireMoon = record('EmpireMoon', (
+    'id', 'name', 'celestial', 'resources', 'facilities', 'ships', 'defences'
+), {
+    'celestial': Celestial.load,
+    'resources': Resources.load,
+    'facilities': MoonFacilities.load,
+    'ships': Ships.load,
+    'defences': Defences.load
+})
+
+
+# Empire view
+empire_json = re.compile(
+    r'createImperiumHtml\("#mainWrapper",\s"#loader",\s(.*),\s\d+\s\);'
+)
+
+
+def empire_levels(record, spec, celestial):
+    # the empire view has levels and amounts only, no build status
+    ids = page_specs[spec].technologies
+    return record(*(
+        TechState(int(celestial.get(str(ids[name])) or 0), None, None)
+        for name in record._fields
+    ))
+
+
+def empire_celestials(response, moon=False):
+    data = json.loads(empire_json.search(response).group(1))
+    celestials = []
+    for celestial in data['planets']:
+        if 'galaxy' in celestial:
+            coordinates = [
+                int(celestial['galaxy']),
+                int(celestial['system']),
+                int(celestial['position'])
+            ]
+        else:
+            coordinates = const.convert_to_coordinates(celestial['coordinates'])
+        coordinates.append(
+            const.destination.moon if moon else const.destination.planet
+        )
+        used = int(celestial.get('fieldUsed') or 0)
+        total = int(celestial.get('fieldMax') or 0)
+        degrees = celestial.get('temperature')
+        if isinstance(degrees, str):
+            degrees = temperature(degrees)
+        production = celestial.get('production') or {}
+        amounts = [
+            int(celestial.get(name) or 0)
+            for name in ('metal', 'crystal', 'deuterium')
+        ]
+        values = dict(
+            id=int(celestial['id']),
+            name=celestial.get('name'),
+            celestial=Celestial(
+                diameter=int(celestial.get('diameter') or 0),
+                used=used,
+                total=total,
+                free=total - used,
+                temperature=degrees,
+                coordinates=coordinates
+            ),
+            resources=Resources(
+                resources=amounts,
+                metal=amounts[0],
+                crystal=amounts[1],
+                deuterium=amounts[2],
+                day_production=[
+                    int(amount) for amount in (production.get('daily') or [])[:3]
+                ],
+                storage=[
+                    int(celestial.get(name + 'Storage') or 0)
+                    for name in ('metal', 'crystal', 'deuterium')
+                ],
+                darkmatter=None,
+                energy=int(celestial.get('energy') or 0)
+            ),
+            ships=empire_levels(Ships, 'shipyard', celestial),
+            defences=empire_levels(Defences, 'defenses', celestial)
+        )
+        if moon:
+            values['facilities'] = empire_levels(
+                MoonFacilities, 'moon_facilities', celestial
+            )
+            celestials.append(EmpireMoon(**values))
+        else:
+            values['supply'] = empire_levels(Supplies, 'supplies', celestial)
+            values['facilities'] = empire_levels(
+                Facilities, 'facilities', celestial
+            )
+            celestials.append(EmpirePlanet(**values))
+    return celestials
+
+
+# Serialization
+def json_default(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps_jsonl(records):
+    return ''.join(
+        json.dumps(record.to_dict(), default=json_default) + '\n'
+        for record in records
+    )
+
+
+def loads_jsonl(text, record):
+    return [record.load(json.loads(line)) for line in text.splitlines() if line]
+
+
+def dumps_binary(records):
+    records = list(records)
+    names = {}
+    kinds = [
+        names.setdefault(type(record).__name__, len(names)) for record in records
+    ]
+    # namedtuples encode as plain json arrays in one pass of the C encoder,
+    # kinds names the record of each row when a batch mixes types
+    return zlib.compress(json.dumps(
+        [list(names), kinds if len(names) > 1 else None, records],
+        separators=(',', ':'), default=json_default
+    ).encode())
+
+
+def loads_binary(data):
+    names, kinds, rows = json.loads(zlib.decompress(data))
+    loaders = [
+        record_types[name].load if record_types[name].converters
+        else record_types[name]._make
+        for name in names
+    ]
+    if kinds is None:
+        return list(map(loaders[0], rows)) if loaders else []
+    return [loaders[kind](row) for kind, row in zip(kinds, rows)]
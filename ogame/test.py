@@ -1,6 +1,12 @@
 import unittest
 from random import randint
 from ogame.constants import *
+from datetime import datetime
+from ogame import benchmark_import
+from ogame import (
+    dumps_jsonl, loads_jsonl, dumps_binary, loads_binary, Position, Fleet,
+    Resources, EmpirePlanet, EmpireMoon
+)
 
 
 class UnittestOgame(unittest.TestCase):
@@ -120,6 +126,32 @@ class UnittestOgame(unittest.TestCase):
         res = self.empire.research()
         self.assertGreater(res.energy.level, -1)
 
+    def test_empire_snapshot(self):
+        snapshot = self.empire.empire_snapshot()
+        for id in self.empire.planet_ids():
+            planet = snapshot[id]
+            self.assertIsInstance(planet, EmpirePlanet)
+            self.assertEqual(planet.id, id)
+            self.assertIsInstance(planet.name, str)
+            self.assertGreater(planet.celestial.diameter, 0)
+            self.assertIsInstance(planet.resources.metal, int)
+            self.assertTrue(0 < planet.supply.metal_mine.level)
+            self.assertGreater(planet.facilities.shipyard.level, -1)
+            self.assertGreater(planet.ships.light_fighter.amount, -1)
+            self.assertGreater(planet.defences.rocket_launcher.amount, -1)
+            self.assertIsNone(planet.supply.metal_mine.is_possible)
+        for id in self.empire.moon_ids():
+            moon = snapshot[id]
+            self.assertIsInstance(moon, EmpireMoon)
+            self.assertEqual(moon.id, id)
+            self.assertGreater(moon.facilities.jump_gate.level, -1)
+
+    def test_research_end(self):
+        end = self.empire.research_end()
+        if end is not None:
+            self.assertIsInstance(end, datetime)
+            self.assertGreater(end, datetime.now())
+
     def test_ships(self):
         ship = self.empire.ships(self.ids[0])
         self.assertGreater(ship.light_fighter.amount, -1)
@@ -175,6 +207,26 @@ class UnittestOgame(unittest.TestCase):
         ).rocket_launcher
         self.assertTrue(before < after.amount or after.in_construction)
 
+    def test_build_many(self):
+        before = self.empire.defences(
+            self.ids[0]
+        ).rocket_launcher.amount
+        results = self.empire.build_many([
+            (buildings.rocket_launcher(), self.empire.planet_ids()[0]),
+            (ships.deathstar(100000), self.empire.planet_ids()[0])
+        ])
+        self.assertEqual(len(results), 2)
+        built, refused = results
+        self.assertEqual(built.planet_id, self.empire.planet_ids()[0])
+        self.assertTrue(built.success)
+        self.assertIsNone(built.error)
+        self.assertFalse(refused.success)
+        self.assertIsInstance(refused.error, str)
+        after = self.empire.defences(
+            self.ids[0]
+        ).rocket_launcher
+        self.assertTrue(before < after.amount or after.in_construction)
+
     def test_deconstruct_and_cancel(self):
         before = self.empire.supply(
             self.ids[0]
@@ -262,3 +314,30 @@ class UnittestOgame(unittest.TestCase):
         self.assertIsInstance(officers.engineer, bool)
         self.assertIsInstance(officers.geologist, bool)
         self.assertIsInstance(officers.technocrat, bool)
+
+    def test_import_time(self):
+        result = benchmark_import()
+        self.assertEqual(result['loaded'], [])
+        self.assertLess(result['seconds'], 1)
+
+    def test_serialization(self):
+        position = Position(
+            'Homeworld', [1, 2, 3], 'player', 100001, 12, 'n', True, None
+        )
+        fleet = Fleet(
+            1, 6, 'friendly', 'player', 100001, False,
+            datetime.fromtimestamp(1700000000), [1, 2, 3], [1, 2, 4]
+        )
+        resources = Resources(
+            [1, 2, 3], 1, 2, 3, [4, 5, 6], [7, 8, 9], 10, 11
+        )
+        self.assertEqual(position.to_dict()['player_id'], 100001)
+        self.assertEqual(Position.load(position.to_dict()), position)
+        self.assertEqual(loads_jsonl(dumps_jsonl([fleet]), Fleet), [fleet])
+        self.assertEqual(loads_binary(dumps_binary([])), [])
+        self.assertEqual(loads_binary(dumps_binary([fleet, fleet])), [fleet] * 2)
+        mixed = loads_binary(dumps_binary([position, resources, position]))
+        self.assertEqual(mixed, [position, resources, position])
+        self.assertIsInstance(mixed[1], Resources)
+        galaxy = self.empire.galaxy(coordinates(1, 1))
+        self.assertEqual(loads_binary(dumps_binary(galaxy)), galaxy)
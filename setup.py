@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name='ogame',
@@ -11,7 +11,12 @@ setup(
     url='https://github.com/alaingilbert/pyogame',
     download_url='https://github.com/alaingilbert/pyogame.git',
     keywords=['OGame', 'lib', 'for bots', 'bot'],
-    install_requires=['requests', 'bs4', 'html5lib'],
+    install_requires=['requests', 'bs4', 'html5lib', 'soupsieve'],
+    extras_require={
+        'captcha': ['Pillow', 'ImageHash', 'opencv-python', 'pytesseract'],
+        'lxml': ['lxml'],
+        'async': ['aiohttp'],
+    },
     classifiers=[
         'Development Status :: 5 - Production/Stable',
         'Intended Audience :: Developers',